@@ -1,6 +1,6 @@
 {
     'name': 'Scrum Project Management',
-    'version': '2.0',
+    'version': '2.1',
     'summary': 'Scrum project management module with AI integration',
     'description': '''
         Scrum Project Management Module with AI Integration
@@ -22,6 +22,7 @@
     'data': [
         'security/ir.model.access.csv',
 		'data/sprint_stage_data.xml',
+        'data/ir_cron_data.xml',
 		'views/project_views.xml',
         'views/product_backlog_views.xml',
         'views/user_story_views.xml',
@@ -33,6 +34,7 @@
         'views/meeting_views.xml',
         'views/ai_analysis_views.xml',
         'views/burndown_chart_views.xml',
+        'views/scrum_report_views.xml',
         'data/menu.xml',
     ],
     'translation': {
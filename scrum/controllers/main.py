@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+from odoo import http
+from odoo.http import request
+
+
+class ScrumBurndownController(http.Controller):
+
+    @http.route('/scrum/burndown_chart/<int:chart_id>/series', type='http', auth='user', methods=['GET'])
+    def burndown_chart_series(self, chart_id, **kwargs):
+        chart = request.env['scrum.burndown_chart'].browse(chart_id).exists()
+        if not chart:
+            raise request.not_found()
+        
+        etag = chart._get_series_etag()
+        headers = [
+            ('ETag', f'"{etag}"'),
+            ('Cache-Control', 'private, no-cache'),
+        ]
+        if request.httprequest.if_none_match.contains(etag):
+            return request.make_response('', headers=headers, status=304)
+        
+        return request.make_json_response(chart._get_series(), headers=headers)
@@ -0,0 +1,12 @@
+# -*- coding: utf-8 -*-
+
+
+def migrate(cr, version):
+    # current_date used to default to the creation day and was ignored; charts
+    # that still hold that default now follow today's progress instead
+    # (the column name is a reserved word, hence the quotes)
+    cr.execute("""
+        UPDATE scrum_burndown_chart
+           SET "current_date" = NULL
+         WHERE "current_date" = create_date::date
+    """)
@@ -3,10 +3,13 @@ from . import product_backlog
 from . import user_story
 from . import sprint_backlog
 from . import sprint_task
+from . import sprint_task_stage_history
 from . import meeting
 from . import sprint_plan
 from . import team
 from . import project_inherit
 from . import sprint_stage
+from . import status_propagation
 from . import ai_analysis
 from . import burndown_chart
+from . import scrum_report
@@ -1,13 +1,34 @@
 # -*- coding: utf-8 -*-
+import hashlib
 import json
 import logging
-import requests
-from datetime import datetime
+from collections import defaultdict
+from datetime import datetime, timedelta
 from odoo import models, fields, api, _
 from odoo.exceptions import UserError
+from ..tools import ai_client, prompt_budget
+from ..tools.ai_cache import response_cache
+from ..tools.ai_resilience import RetryLaterError
 
 _logger = logging.getLogger(__name__)
 
+STALE_ANALYSIS_MINUTES = 15
+
+# per-field token caps at full scale; halved each time the prompt is over budget
+PROMPT_FIELD_TOKEN_LIMITS = {
+    'project_description': 300,
+    'task_description': 800,
+    'user_story_description': 800,
+    'acceptance_criteria': 600,
+    'sprint_goal': 200,
+}
+SPRINT_DIGEST_TOKEN_LIMIT = 2000
+DIGEST_NAME_TOKEN_LIMIT = 40
+PROMPT_FIT_ATTEMPTS = 4
+
+# analysis types whose prompts can pack several stories or tasks in one request
+BATCHABLE_ANALYSIS_TYPES = ('quality', 'requirement')
+
 
 class ScrumAIAnalysis(models.Model):
     _name = 'scrum.ai_analysis'
@@ -31,6 +52,7 @@ class ScrumAIAnalysis(models.Model):
     
     status = fields.Selection([
         ('pending', _('Pending')),
+        ('queued', _('Queued')),
         ('analyzing', _('Analyzing')),
         ('completed', _('Completed')),
         ('failed', _('Failed')),
@@ -52,12 +74,18 @@ class ScrumAIAnalysis(models.Model):
     analysis_data = fields.Json(string='Analysis Data', help='Detailed JSON data from AI')
     analysis_data_formatted = fields.Text(string='Formatted Analysis Data', compute='_compute_analysis_data_formatted')
     
-    ai_model = fields.Char(string='AI Model Used', default='gpt-4')
-    api_endpoint = fields.Char(string='API Endpoint', default='https://api.openai.com/v1/chat/completions')
-    api_key = fields.Char(string='API Key', help='AI API Key for authentication')
+    ai_model = fields.Char(string='AI Model Used', default=lambda self: self._get_default_connection_values()['ai_model'])
+    api_endpoint = fields.Char(string='API Endpoint', default=lambda self: self._get_default_connection_values()['api_endpoint'])
+    api_key = fields.Char(string='API Key', help='AI API Key for authentication', default=lambda self: self._get_default_connection_values()['api_key'])
+    
+    bypass_cache = fields.Boolean(string='Force Fresh Analysis', help='Always call the AI service instead of reusing a cached response for the same prompt')
+    from_cache = fields.Boolean(string='From Cache', readonly=True, copy=False)
+    prompt_tokens = fields.Integer(string='Prompt Tokens', readonly=True, copy=False)
+    use_streaming = fields.Boolean(string='Stream Response', help='Receive the response incrementally and show partial feedback while the analysis runs')
     
     analyzed_by = fields.Many2one('res.users', string='Analyzed By', default=lambda self: self.env.user)
     analyzed_date = fields.Datetime(string='Analyzed Date')
+    claimed_date = fields.Datetime(string='Claimed Date', readonly=True, copy=False, help='When a queue worker started this analysis')
     
     approval_status = fields.Selection([
         ('pending', _('Pending Approval')),
@@ -68,6 +96,15 @@ class ScrumAIAnalysis(models.Model):
     approved_date = fields.Datetime(string='Approved Date')
     approval_notes = fields.Text(string='Approval Notes')
     
+    @api.model
+    def _get_default_connection_values(self):
+        get_param = self.env['ir.config_parameter'].sudo().get_param
+        return {
+            'ai_model': get_param('scrum.ai_model', 'gpt-4'),
+            'api_endpoint': get_param('scrum.ai_endpoint', 'https://api.openai.com/v1/chat/completions'),
+            'api_key': self.env.context.get('ai_api_key') or get_param('scrum.ai_api_key', False),
+        }
+    
     @api.depends('analysis_type', 'project_id', 'sprint_plan_id', 'sprint_backlog_id', 'user_story_id')
     def _compute_name(self):
         for record in self:
@@ -86,16 +123,19 @@ class ScrumAIAnalysis(models.Model):
     @api.depends('score')
     def _compute_grade(self):
         for record in self:
-            if record.score >= 90:
-                record.grade = 'A'
-            elif record.score >= 80:
-                record.grade = 'B'
-            elif record.score >= 70:
-                record.grade = 'C'
-            elif record.score >= 60:
-                record.grade = 'D'
-            else:
-                record.grade = 'E'
+            record.grade = self._get_grade(record.score)
+    
+    @api.model
+    def _get_grade(self, score):
+        if score >= 90:
+            return 'A'
+        elif score >= 80:
+            return 'B'
+        elif score >= 70:
+            return 'C'
+        elif score >= 60:
+            return 'D'
+        return 'E'
     
     @api.depends('analysis_data')
     def _compute_analysis_data_formatted(self):
@@ -106,38 +146,339 @@ class ScrumAIAnalysis(models.Model):
                 record.analysis_data_formatted = False
     
     def action_analyze(self):
+        analyses = self.filtered(lambda a: a.status not in ('queued', 'analyzing'))
+        if not analyses:
+            return
+        # the queue worker runs without the caller's context, so a key passed
+        # through it has to be kept on the analyses themselves
+        context_key = self.env.context.get('ai_api_key')
+        if context_key:
+            analyses.filtered(lambda a: not a.api_key).write({'api_key': context_key})
+        analyses.write({'status': 'queued'})
+        self._trigger_analysis_queue()
+    
+    @api.model
+    def _queue_batch_analyses(self, records, analysis_type):
+        record_field = {
+            'scrum.user_story': 'user_story_id',
+            'scrum.sprint_task': 'sprint_task_id',
+            'scrum.sprint_plan': 'sprint_plan_id',
+        }[records._name]
+        records = records.filtered('project_id')
+        if not records:
+            raise UserError(_('The selected records are not linked to a project.'))
+        
+        connection = self._get_default_connection_values()
+        analyses = self.create([{
+            **connection,
+            'analysis_type': analysis_type,
+            'project_id': record.project_id.id,
+            record_field: record.id,
+        } for record in records])
+        analyses.action_analyze()
+        return {
+            'name': _('AI Analyses'),
+            'type': 'ir.actions.act_window',
+            'res_model': 'scrum.ai_analysis',
+            'view_mode': 'list,form',
+            'domain': [('id', 'in', analyses.ids)],
+        }
+    
+    @api.model
+    def _trigger_analysis_queue(self, at=None):
+        cron = self.env.ref('scrum.ir_cron_process_ai_analysis_queue', raise_if_not_found=False)
+        if cron:
+            cron._trigger(at=at)
+    
+    @api.model
+    def _cron_process_analysis_queue(self):
+        self._requeue_stale_analyses()
+        get_param = self.env['ir.config_parameter'].sudo().get_param
+        analyses = self._claim_queued_analyses(int(get_param('scrum.ai_queue_batch_size', 20)))
+        if not analyses:
+            return
+        retry_in = analyses._process_claimed_analyses(
+            max_workers=int(get_param('scrum.ai_max_workers', 8)),
+            endpoint_limit=int(get_param('scrum.ai_endpoint_concurrency', 4)),
+        )
+        if retry_in:
+            # the provider is down or rate limiting: come back when it asked us to
+            self._trigger_analysis_queue(at=fields.Datetime.now() + timedelta(seconds=retry_in))
+        elif self.search_count([('status', '=', 'queued')], limit=1):
+            # leave the rest of the queue to a fresh run instead of looping past the cron timeout
+            self._trigger_analysis_queue()
+    
+    @api.model
+    def _requeue_stale_analyses(self):
+        stale = self.search([
+            ('status', '=', 'analyzing'),
+            ('claimed_date', '<', fields.Datetime.now() - timedelta(minutes=STALE_ANALYSIS_MINUTES)),
+        ])
+        if stale:
+            _logger.warning('Requeueing %s stale AI analyses', len(stale))
+            stale.write({'status': 'queued'})
+            self.env.cr.commit()
+    
+    @api.model
+    def _claim_queued_analyses(self, limit):
+        # SKIP LOCKED lets several workers drain the queue without picking the same job
+        self.env.cr.execute("""
+            SELECT id
+              FROM scrum_ai_analysis
+             WHERE status = 'queued'
+          ORDER BY id
+             LIMIT %s
+               FOR UPDATE SKIP LOCKED
+        """, [limit])
+        analyses = self.browse([row[0] for row in self.env.cr.fetchall()])
+        if analyses:
+            analyses.write({'status': 'analyzing', 'claimed_date': fields.Datetime.now()})
+            self.env.cr.commit()
+        return analyses
+    
+    def _process_claimed_analyses(self, max_workers=8, endpoint_limit=4):
+        # build every request up front so the related records are prefetched as one batch
+        prepared = {}
+        for analysis in self:
+            try:
+                prompt = analysis._build_prompt()
+                prepared[analysis] = analysis._prepare_ai_request(prompt)
+            except Exception as e:
+                _logger.error('AI Analysis failed: %s', e)
+                analysis._apply_ai_failure(e)
+        
+        self._configure_response_cache()
+        outcomes, batches, singles = self._pack_batched_analyses(prepared)
+        
+        # do not keep a transaction open while waiting for the AI service
+        self.env.cr.commit()
+        
+        def send(analyses_list, extra_requests=()):
+            return ai_client.post_chat_completions(
+                list(extra_requests) + [prepared[analysis] for analysis in analyses_list],
+                max_workers=max_workers, endpoint_limit=endpoint_limit,
+                parse=self._parse_ai_response, cache=response_cache,
+                cacheable=lambda result: not result.get('parse_error'),
+            )
+        
+        responses = send(singles, [request for __, request in batches])
+        retry = []
+        for (batch, __), (results, error, __) in zip(batches, responses):
+            if error is not None:
+                _logger.warning('Batched AI analysis of %s items failed, analyzing them one by one: %s', len(batch), error)
+                results = {}
+            for analysis in batch:
+                result = results.get(analysis.id)
+                if result is None:
+                    # only the items the model did not answer properly are sent again
+                    retry.append(analysis)
+                else:
+                    response_cache.put(prepared[analysis]['cache_key'], result)
+                    outcomes[analysis] = (result, None, False)
+        outcomes.update(zip(singles, responses[len(batches):]))
+        if retry:
+            outcomes.update(zip(retry, send(retry)))
+        
+        retry_in = 0
+        writes = defaultdict(lambda: [self.browse(), None])
+        for analysis, (result, error, cached) in outcomes.items():
+            if error is None:
+                vals = self._get_ai_result_values(result, from_cache=cached)
+            elif isinstance(error, RetryLaterError):
+                # not the analysis' fault, keep it for a later run
+                vals = {'status': 'queued'}
+                retry_in = max(retry_in, error.retry_in, 1)
+            else:
+                _logger.error('AI Analysis failed: %s', error)
+                vals = self._get_ai_failure_values(error)
+            # analyses ending with the same values (failures, cache hits) share one write
+            group = writes[json.dumps(vals, sort_keys=True, default=str)]
+            group[0] |= analysis
+            group[1] = vals
+        for analyses, vals in writes.values():
+            analyses.write(vals)
+        self.env.cr.commit()
+        
+        stats = response_cache.get_stats()
+        _logger.info('AI response cache: %s hits, %s coalesced, %s misses (hit rate %.0f%%)',
+                     stats['hits'], stats['coalesced'], stats['misses'], stats['hit_rate'] * 100)
+        
+        for stat in ai_client.get_connection_stats():
+            _logger.info('AI endpoint %(endpoint)s (pid %(pid)s): %(requests)s requests over %(connections)s connections', stat)
+        return retry_in
+    
+    def _pack_batched_analyses(self, prepared):
+        """ Split the prepared requests into cached outcomes, multi-item
+        batches ``(analyses, request)`` and analyses sent on their own. """
+        get_param = self.env['ir.config_parameter'].sudo().get_param
+        max_items = int(get_param('scrum.ai_items_per_prompt', 10))
+        # the answer shares the budget with the prompt: every item needs room for its result
+        output_per_item = int(get_param('scrum.ai_batch_item_output_tokens', 400))
+        outcomes = {}
+        singles = []
+        groups = defaultdict(list)
+        for analysis, request in prepared.items():
+            if max_items < 2 or not analysis._is_batchable():
+                singles.append(analysis)
+                continue
+            # a miss is counted once the item is actually sent, alone or in a batch
+            result = None if analysis.bypass_cache else response_cache.get(request['cache_key'], count_miss=False)
+            if result is not None:
+                outcomes[analysis] = (result, None, True)
+            else:
+                groups[(analysis.ai_model, analysis.api_endpoint, analysis.api_key, analysis.analysis_type)].append(analysis)
+        
+        batches = []
+        
+        def flush(batch, items):
+            if len(batch) == 1:
+                singles.append(batch[0])
+            elif batch:
+                batch = self.browse([analysis.id for analysis in batch])
+                prompt = batch._generate_batch_prompt([items[analysis] for analysis in batch])
+                _logger.info('AI analyses %s batched into one prompt of %s tokens',
+                             batch.ids, prompt_budget.count_tokens(prompt, batch[0].ai_model))
+                request = dict(batch[0]._prepare_ai_request(prompt), cache_key=None, parse=self._parse_batch_response)
+                request['payload'] = dict(request['payload'], max_tokens=output_per_item * len(batch))
+                # without streaming nothing arrives until every item is generated
+                connect_timeout, read_timeout = request['timeout']
+                request['timeout'] = (connect_timeout, read_timeout * len(batch))
+                batches.append((batch, request))
+        
+        for analyses in groups.values():
+            model = analyses[0].ai_model
+            budget = analyses[0]._get_prompt_budget()
+            items = {analysis: analysis._generate_batch_item(analysis._prepare_analysis_context()) for analysis in analyses}
+            overhead = prompt_budget.count_tokens(analyses[0]._generate_batch_prompt([]), model)
+            batch, used = [], overhead
+            for analysis in analyses:
+                tokens = prompt_budget.count_tokens(items[analysis], model) + output_per_item
+                if batch and (len(batch) >= max_items or used + tokens > budget):
+                    flush(batch, items)
+                    batch, used = [], overhead
+                batch.append(analysis)
+                used += tokens
+            flush(batch, items)
+        return outcomes, batches, singles
+    
+    def _is_batchable(self):
         self.ensure_one()
-        self.write({
-            'status': 'analyzing',
-            'analyzed_date': datetime.now()
-        })
+        return (self.analysis_type in BATCHABLE_ANALYSIS_TYPES and not self.use_streaming
+                and bool(self.user_story_id or self.sprint_task_id))
+    
+    def _generate_batch_item(self, context):
+        self.ensure_one()
+        generators = {
+            'quality': self._generate_quality_item,
+            'requirement': self._generate_requirement_item,
+        }
+        return f"""
+        Item {self.id}:
+            Project: {context['project_name']}
+        {generators[self.analysis_type](context)}"""
+    
+    def _generate_batch_prompt(self, items):
+        # ``self`` holds the analyses of one batch, all of the same type
+        analysis_type = self[:1].analysis_type
+        intros = {
+            'quality': 'As an AI quality analyst, please evaluate each of the following Scrum project components for quality:',
+            'requirement': 'As an AI requirement analyst, please evaluate each of the following Scrum components for requirement compliance:',
+        }
+        instructions = {
+            'quality': self._get_quality_instructions,
+            'requirement': self._get_requirement_instructions,
+        }
+        prompt = f"""
+        {intros[analysis_type]}
+        """
+        prompt += ''.join(items)
+        prompt += instructions[analysis_type]()
+        prompt += """
+        Evaluate every item separately and respond with a JSON object of the form
+        {"results": [...]} holding one entry per item, each with the structure above
+        and an additional "id" field set to the item number.
+        """
+        return prompt
+    
+    def _parse_batch_response(self, response):
+        # {analysis id: result} for the items that were answered properly; runs in
+        # the AI client threads, so it must not touch the ORM
+        data = json.loads(response)
+        items = data.get('results') if isinstance(data, dict) else data
+        results = {}
+        for item in items if isinstance(items, list) else []:
+            if not isinstance(item, dict) or 'score' not in item:
+                continue
+            try:
+                results[int(item['id'])] = item
+            except (KeyError, TypeError, ValueError):
+                continue
+        return results
+    
+    @api.model
+    def get_ai_connection_stats(self):
+        return ai_client.get_connection_stats()
+    
+    @api.model
+    def get_ai_cache_stats(self):
+        return response_cache.get_stats()
+    
+    @api.model
+    def _configure_response_cache(self):
+        get_param = self.env['ir.config_parameter'].sudo().get_param
+        response_cache.configure(int(get_param('scrum.ai_cache_size', 512)), int(get_param('scrum.ai_cache_ttl', 86400)))
+    
+    def _get_cache_key(self, prompt):
+        self.ensure_one()
+        key = json.dumps([self.ai_model, self.analysis_type, prompt])
+        return hashlib.sha256(key.encode()).hexdigest()
+    
+    @api.model
+    def _get_ai_result_values(self, result, from_cache=False):
+        return {
+            'status': 'completed',
+            'analyzed_date': fields.Datetime.now(),
+            'from_cache': from_cache,
+            'score': result.get('score', 0.0),
+            'ai_feedback': result.get('feedback', ''),
+            'suggestions': result.get('suggestions', ''),
+            'issues_found': result.get('issues', ''),
+            'analysis_data': result.get('details', {}),
+        }
+    
+    @api.model
+    def _get_ai_failure_values(self, error):
+        return {
+            'status': 'failed',
+            'ai_feedback': f'Analysis failed: {str(error)}'
+        }
+    
+    def _apply_ai_failure(self, error):
+        self.write(self._get_ai_failure_values(error))
+    
+    def _get_prompt_budget(self):
+        self.ensure_one()
+        budget = int(self.env['ir.config_parameter'].sudo().get_param('scrum.ai_prompt_budget', 0))
+        return budget or prompt_budget.get_prompt_budget(self.ai_model)
+    
+    def _build_prompt(self):
+        self.ensure_one()
+        budget = self._get_prompt_budget()
+        scale = 1.0
+        for __ in range(PROMPT_FIT_ATTEMPTS):
+            prompt = self._generate_prompt(self._prepare_analysis_context(scale))
+            tokens = prompt_budget.count_tokens(prompt, self.ai_model)
+            if tokens <= budget:
+                break
+            scale /= 2
+        else:
+            _logger.warning('AI analysis %s prompt is still over budget: %s > %s tokens', self.id, tokens, budget)
         
-        try:
-            context_data = self._prepare_analysis_context()
-            prompt = self._generate_prompt(context_data)
-            
-            ai_response = self._call_ai_service(prompt)
-            
-            result = self._parse_ai_response(ai_response)
-            
-            self.write({
-                'status': 'completed',
-                'score': result.get('score', 0.0),
-                'ai_feedback': result.get('feedback', ''),
-                'suggestions': result.get('suggestions', ''),
-                'issues_found': result.get('issues', ''),
-                'analysis_data': result.get('details', {}),
-            })
-            
-        except Exception as e:
-            _logger.error('AI Analysis failed: %s', e)
-            self.write({
-                'status': 'failed',
-                'ai_feedback': f'Analysis failed: {str(e)}'
-            })
-            raise UserError(_('AI Analysis failed: %s') % e)
+        _logger.info('AI analysis %s prompt: %s tokens (budget %s)', self.id, tokens, budget)
+        self.prompt_tokens = tokens
+        return prompt
     
-    def _prepare_analysis_context(self):
+    def _prepare_analysis_context(self, scale=1.0):
         self.ensure_one()
         context = {
             'project_name': self.project_id.name,
@@ -197,21 +538,61 @@ class ScrumAIAnalysis(models.Model):
                 'total_backlogs': plan.total_backlogs,
                 'completed_backlogs': plan.completed_backlogs,
                 'backlog_completion_percentage': plan.backlog_completion_percentage,
+                'sprint_digest': self._build_sprint_digest(plan, int(SPRINT_DIGEST_TOKEN_LIMIT * scale)),
             })
         
+        for key, limit in PROMPT_FIELD_TOKEN_LIMITS.items():
+            if context.get(key):
+                context[key] = prompt_budget.truncate_text(context[key], int(limit * scale), self.ai_model)
         return context
     
+    def _build_sprint_digest(self, plan, token_limit):
+        # backlogs with the most open work first, then open tasks by priority and size
+        model = self.ai_model
+        closed_stage_ids = self.env['scrum.sprint_stage']._get_closed_stage_ids()
+        
+        def name(record):
+            return prompt_budget.truncate_text(record.name, DIGEST_NAME_TOKEN_LIMIT, model)
+        
+        backlogs = plan.sprint_backlog_ids.sorted(lambda b: (b.completed_tasks - b.total_tasks, b.id))
+        backlog_lines = [
+            f"- {name(backlog)} [{backlog.status}]: {backlog.completed_tasks}/{backlog.total_tasks} tasks done, "
+            f"{backlog.total_story_points} story points"
+            for backlog in backlogs
+        ]
+        tasks = backlogs.sprint_task_ids.sorted(
+            lambda t: (t.sprint_stage_id.id in closed_stage_ids, -t.priority, -t.estimated_hours, t.id))
+        task_lines = [
+            f"- {name(task)} ({name(task.sprint_backlog_id)}) [{task.sprint_stage_id.name}]: "
+            f"{task.estimated_hours}h estimated, {task.actual_hours}h spent"
+            for task in tasks
+        ]
+        
+        # backlogs get up to half of the budget, tasks whatever is left
+        kept_backlogs, omitted_backlogs = prompt_budget.take_within_budget(backlog_lines, token_limit // 2, model)
+        used = prompt_budget.count_tokens('\n'.join(kept_backlogs), model)
+        kept_tasks, omitted_tasks = prompt_budget.take_within_budget(task_lines, token_limit - used, model)
+        
+        lines = ['Backlogs:'] + kept_backlogs
+        if omitted_backlogs:
+            lines.append(f'- ... {omitted_backlogs} more backlogs')
+        lines += ['Tasks:'] + kept_tasks
+        if omitted_tasks:
+            lines.append(f'- ... {omitted_tasks} more tasks')
+        return '\n'.join(lines)
+    
     def _generate_prompt(self, context):
         self.ensure_one()
         
-        prompts = {
-            'quality': self._generate_quality_prompt(context),
-            'requirement': self._generate_requirement_prompt(context),
-            'code_review': self._generate_code_review_prompt(context),
-            'sprint_review': self._generate_sprint_review_prompt(context),
+        generators = {
+            'quality': self._generate_quality_prompt,
+            'requirement': self._generate_requirement_prompt,
+            'code_review': self._generate_code_review_prompt,
+            'sprint_review': self._generate_sprint_review_prompt,
         }
         
-        return prompts.get(self.analysis_type, '')
+        generator = generators.get(self.analysis_type)
+        return generator(context) if generator else ''
     
     def _generate_quality_prompt(self, context):
         prompt = f"""
@@ -221,8 +602,13 @@ class ScrumAIAnalysis(models.Model):
         Type: {context['analysis_type']}
         
         """
+        prompt += self._generate_quality_item(context)
+        prompt += self._get_quality_instructions()
+        return prompt
+    
+    def _generate_quality_item(self, context):
         if 'task_name' in context:
-            prompt += f"""
+            return f"""
             Task: {context['task_name']}
             Description: {context['task_description']}
             Status: {context['task_status']}
@@ -232,7 +618,7 @@ class ScrumAIAnalysis(models.Model):
             Acceptance Criteria: {context.get('acceptance_criteria', 'N/A')}
             """
         elif 'user_story' in context:
-            prompt += f"""
+            return f"""
             User Story: {context['user_story']}
             Description: {context['user_story_description']}
             Acceptance Criteria: {context['acceptance_criteria']}
@@ -240,8 +626,10 @@ class ScrumAIAnalysis(models.Model):
             Story Points: {context['estimated_story_points']}
             Task Completion: {context['task_completion_percentage']}% ({context['completed_tasks']}/{context['total_tasks']} tasks)
             """
-        
-        prompt += """
+        return ''
+    
+    def _get_quality_instructions(self):
+        return """
         
         Please provide:
         1. A quality score from 0-100 (considering completeness, clarity, alignment with Scrum practices)
@@ -263,7 +651,6 @@ class ScrumAIAnalysis(models.Model):
             }
         }
         """
-        return prompt
     
     def _generate_requirement_prompt(self, context):
         prompt = f"""
@@ -272,20 +659,27 @@ class ScrumAIAnalysis(models.Model):
         Project: {context['project_name']}
         
         """
+        prompt += self._generate_requirement_item(context)
+        prompt += self._get_requirement_instructions()
+        return prompt
+    
+    def _generate_requirement_item(self, context):
         if 'user_story' in context:
-            prompt += f"""
+            return f"""
             User Story: {context['user_story']}
             Description: {context['user_story_description']}
             Acceptance Criteria: {context['acceptance_criteria']}
             """
         elif 'task_name' in context:
-            prompt += f"""
+            return f"""
             Task: {context['task_name']}
             Description: {context['task_description']}
             User Story Acceptance Criteria: {context.get('acceptance_criteria', 'N/A')}
             """
-        
-        prompt += """
+        return ''
+    
+    def _get_requirement_instructions(self):
+        return """
         
         Please evaluate:
         1. Whether requirements are clearly defined
@@ -307,7 +701,6 @@ class ScrumAIAnalysis(models.Model):
             }
         }
         """
-        return prompt
     
     def _generate_code_review_prompt(self, context):
         prompt = f"""
@@ -315,7 +708,8 @@ class ScrumAIAnalysis(models.Model):
         
         Task: {context.get('task_name', 'N/A')}
         User Story: {context.get('user_story', 'N/A')}
-        
+        """
+        prompt += """
         Based on the task description and acceptance criteria, provide:
         1. Quality score (0-100)
         2. Code quality assessment
@@ -347,6 +741,10 @@ class ScrumAIAnalysis(models.Model):
         Status: {context.get('status', 'N/A')}
         Completion: {context.get('backlog_completion_percentage', context.get('completion_percentage', 0))}%
         
+        Sprint Contents:
+{context.get('sprint_digest', 'N/A')}
+        """
+        prompt += """
         Please evaluate:
         1. Sprint goal achievement
         2. Delivery quality
@@ -369,12 +767,14 @@ class ScrumAIAnalysis(models.Model):
         """
         return prompt
     
-    def _call_ai_service(self, prompt):
+    def _prepare_ai_request(self, prompt):
         self.ensure_one()
+        api_key = (self.api_key or self.env.context.get('ai_api_key')
+                   or self.env['ir.config_parameter'].sudo().get_param('scrum.ai_api_key', ''))
         
         headers = {
             'Content-Type': 'application/json',
-            'Authorization': f'Bearer {self.api_key or self.env.context.get('ai_api_key', '')}'
+            'Authorization': f'Bearer {api_key}'
         }
         
         data = {
@@ -387,11 +787,46 @@ class ScrumAIAnalysis(models.Model):
             'response_format': {'type': 'json_object'}
         }
         
-        response = requests.post(self.api_endpoint, headers=headers, json=data, timeout=30)
-        response.raise_for_status()
+        get_param = self.env['ir.config_parameter'].sudo().get_param
+        return {
+            'endpoint': self.api_endpoint,
+            'headers': headers,
+            'payload': data,
+            'cache_key': self._get_cache_key(prompt),
+            'fresh': self.bypass_cache,
+            'stream': self.use_streaming,
+            'on_partial': self._get_partial_feedback_writer() if self.use_streaming else None,
+            'partial_interval': float(get_param('scrum.ai_stream_write_interval', 2)),
+            'timeout': (float(get_param('scrum.ai_connect_timeout', 5)), float(get_param('scrum.ai_read_timeout', 30))),
+            'pool_size': int(get_param('scrum.ai_pool_size', 10)),
+            'retry': {
+                'max_retries': int(get_param('scrum.ai_max_retries', 3)),
+                'backoff_base': float(get_param('scrum.ai_backoff_base', 1)),
+                'backoff_max': float(get_param('scrum.ai_backoff_max', 30)),
+                'retry_budget_ratio': float(get_param('scrum.ai_retry_budget_ratio', 0.2)),
+                'circuit_failure_threshold': int(get_param('scrum.ai_circuit_failure_threshold', 5)),
+                'circuit_reset_timeout': float(get_param('scrum.ai_circuit_reset_timeout', 60)),
+            },
+        }
+    
+    def _get_partial_feedback_writer(self):
+        # called from the AI client threads: use a cursor of its own and plain
+        # SQL so that partial text is visible to users before the job ends
+        registry = self.env.registry
+        analysis_id = self.id
         
-        result = response.json()
-        return result['choices'][0]['message']['content']
+        def write_partial(text):
+            # the completion is a JSON document: only show the feedback written so far
+            feedback = ai_client.extract_partial_json_string(text, 'feedback')
+            if not feedback:
+                return
+            with registry.cursor() as cr:
+                cr.execute("""
+                    UPDATE scrum_ai_analysis
+                       SET ai_feedback = %s
+                     WHERE id = %s AND status = 'analyzing'
+                """, [feedback, analysis_id])
+        return write_partial
     
     def _parse_ai_response(self, response):
         try:
@@ -403,7 +838,8 @@ class ScrumAIAnalysis(models.Model):
                 'feedback': 'Unable to parse AI response',
                 'suggestions': '',
                 'issues': 'JSON parsing error',
-                'details': {}
+                'details': {},
+                'parse_error': True,
             }
     
     def action_approve(self):
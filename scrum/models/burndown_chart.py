@@ -1,4 +1,7 @@
 # -*- coding: utf-8 -*-
+import hashlib
+import json
+from collections import defaultdict
 from datetime import datetime, timedelta
 from odoo import models, fields, api, _
 from odoo.exceptions import UserError
@@ -28,6 +31,11 @@ class ScrumBurndownData(models.Model):
     variance = fields.Float(string='Variance', compute='_compute_variance', store=True, help='Difference between actual and ideal remaining')
     
     notes = fields.Text(string='Notes')
+    is_snapshot = fields.Boolean(string='Snapshot', default=False, readonly=True, help='End-of-day snapshot; never recomputed')
+
+    _sql_constraints = [
+        ('sprint_plan_date_uniq', 'unique(sprint_plan_id, date)', 'Only one burndown data row per sprint and date is allowed.'),
+    ]
 
     @api.depends('sprint_plan_id', 'date')
     def _compute_name(self):
@@ -37,7 +45,7 @@ class ScrumBurndownData(models.Model):
             else:
                 record.name = 'Burndown Data'
 
-    @api.depends('sprint_plan_id', 'date', 'total_story_points')
+    @api.depends('sprint_plan_id', 'sprint_plan_id.start_date', 'sprint_plan_id.end_date', 'date', 'total_story_points')
     def _compute_ideal_remaining(self):
         for record in self:
             if not record.sprint_plan_id or not record.date:
@@ -67,6 +75,145 @@ class ScrumBurndownData(models.Model):
         for record in self:
             record.variance = record.remaining_story_points - record.ideal_remaining
 
+    def _write_progress_rows(self, rows):
+        # rows: (id, completed_story_points, completed_tasks, completed_hours,
+        #        remaining_story_points, remaining_tasks, remaining_hours)
+        if not rows:
+            return
+        
+        self.flush_model()
+        values = ', '.join(['(%s, %s, %s, %s, %s, %s, %s)'] * len(rows))
+        self.env.cr.execute(f"""
+            UPDATE scrum_burndown_data AS d
+               SET completed_story_points = v.completed_story_points,
+                   completed_tasks = v.completed_tasks,
+                   completed_hours = v.completed_hours,
+                   remaining_story_points = v.remaining_story_points,
+                   remaining_tasks = v.remaining_tasks,
+                   remaining_hours = v.remaining_hours,
+                   variance = v.remaining_story_points - COALESCE(d.ideal_remaining, 0)
+              FROM (VALUES {values}) AS v(id, completed_story_points, completed_tasks, completed_hours,
+                                          remaining_story_points, remaining_tasks, remaining_hours)
+             WHERE d.id = v.id
+         RETURNING d.sprint_plan_id
+        """, [value for row in rows for value in row])
+        sprint_plan_ids = {row[0] for row in self.env.cr.fetchall()}
+        self.browse([row[0] for row in rows]).invalidate_recordset([
+            'completed_story_points', 'completed_tasks', 'completed_hours',
+            'remaining_story_points', 'remaining_tasks', 'remaining_hours', 'variance',
+        ])
+        self._invalidate_chart_series(sprint_plan_ids)
+
+    @api.model
+    def _apply_progress_deltas(self, deltas):
+        # deltas: {(sprint_plan_id, date): [story_points, tasks, hours]}, applied to
+        # every row of that sprint dated on or after the given date
+        deltas = [(plan_id, date, *delta) for (plan_id, date), delta in deltas.items() if any(delta)]
+        if not deltas:
+            return
+        
+        self.flush_model()
+        values = ', '.join(['(%s, %s, %s, %s, %s)'] * len(deltas))
+        self.env.cr.execute(f"""
+            UPDATE scrum_burndown_data AS d
+               SET completed_story_points = d.completed_story_points + agg.story_points,
+                   completed_tasks = d.completed_tasks + agg.tasks,
+                   completed_hours = d.completed_hours + agg.hours,
+                   remaining_story_points = d.remaining_story_points - agg.story_points,
+                   remaining_tasks = d.remaining_tasks - agg.tasks,
+                   remaining_hours = d.remaining_hours - agg.hours,
+                   variance = d.variance - agg.story_points
+              FROM (
+                    SELECT r.id, SUM(v.story_points) AS story_points, SUM(v.tasks) AS tasks, SUM(v.hours) AS hours
+                      FROM scrum_burndown_data r
+                      JOIN (VALUES {values}) AS v(sprint_plan_id, date, story_points, tasks, hours)
+                        ON r.sprint_plan_id = v.sprint_plan_id AND r.date >= v.date AND NOT r.is_snapshot
+                  GROUP BY r.id
+                   ) AS agg
+             WHERE d.id = agg.id
+         RETURNING d.id, d.sprint_plan_id
+        """, [value for delta in deltas for value in delta])
+        rows = self.env.cr.fetchall()
+        self.browse([row[0] for row in rows]).invalidate_recordset([
+            'completed_story_points', 'completed_tasks', 'completed_hours',
+            'remaining_story_points', 'remaining_tasks', 'remaining_hours', 'variance',
+        ])
+        self._invalidate_chart_series({row[1] for row in rows})
+
+    @api.model
+    def _invalidate_chart_series(self, sprint_plan_ids):
+        if not sprint_plan_ids:
+            return
+        self.env['scrum.burndown_chart'].flush_model(['series_data', 'series_etag'])
+        self.env.cr.execute("""
+            UPDATE scrum_burndown_chart
+               SET series_data = NULL, series_etag = NULL
+             WHERE sprint_plan_id IN %s
+               AND series_etag IS NOT NULL
+         RETURNING id
+        """, [tuple(sprint_plan_ids)])
+        chart_ids = [row[0] for row in self.env.cr.fetchall()]
+        self.env['scrum.burndown_chart'].browse(chart_ids).invalidate_recordset(['series_data', 'series_etag'])
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        self._invalidate_chart_series(set(records.sprint_plan_id.ids))
+        return records
+
+    def write(self, vals):
+        sprint_plan_ids = set(self.sprint_plan_id.ids)
+        result = super().write(vals)
+        self._invalidate_chart_series(sprint_plan_ids | set(self.sprint_plan_id.ids))
+        return result
+
+    def unlink(self):
+        sprint_plan_ids = set(self.sprint_plan_id.ids)
+        result = super().unlink()
+        self._invalidate_chart_series(sprint_plan_ids)
+        return result
+
+    @api.model
+    def _cron_snapshot_burndown(self):
+        today = fields.Date.context_today(self)
+        sprint_plans = self.env['scrum.sprint_plan'].search([
+            ('status', '=', 'in_progress'),
+            ('start_date', '<=', today),
+            ('end_date', '>=', today),
+        ])
+        if not sprint_plans:
+            return
+        
+        totals = sprint_plans._get_burndown_totals()
+        existing_data = {
+            data.sprint_plan_id.id: data
+            for data in self.search([('sprint_plan_id', 'in', sprint_plans.ids), ('date', '=', today)])
+        }
+        
+        vals_list = []
+        for sprint_plan in sprint_plans:
+            plan_totals = totals.get(sprint_plan.id, {})
+            vals = {
+                'total_story_points': plan_totals.get('total_story_points', 0.0),
+                'completed_story_points': plan_totals.get('completed_story_points', 0.0),
+                'remaining_story_points': plan_totals.get('total_story_points', 0.0) - plan_totals.get('completed_story_points', 0.0),
+                'total_tasks': plan_totals.get('total_tasks', 0),
+                'completed_tasks': plan_totals.get('completed_tasks', 0),
+                'remaining_tasks': plan_totals.get('total_tasks', 0) - plan_totals.get('completed_tasks', 0),
+                'total_hours': plan_totals.get('total_hours', 0.0),
+                'completed_hours': plan_totals.get('completed_hours', 0.0),
+                'remaining_hours': plan_totals.get('total_hours', 0.0) - plan_totals.get('completed_hours', 0.0),
+                'is_snapshot': True,
+            }
+            data = existing_data.get(sprint_plan.id)
+            if data:
+                if not data.is_snapshot:
+                    data.write(vals)
+            else:
+                vals_list.append(dict(vals, sprint_plan_id=sprint_plan.id, date=today))
+        
+        self.create(vals_list)
+
     @api.constrains('date', 'sprint_plan_id')
     def _check_date_within_sprint(self):
         for record in self:
@@ -94,33 +241,44 @@ class ScrumBurndownChart(models.Model):
     
     data_ids = fields.One2many('scrum.burndown_data', 'sprint_plan_id', string='Burndown Data')
     
-    current_date = fields.Date(string='Current Date', default=fields.Date.today, help='Date to show current progress')
+    current_date = fields.Date(string='Current Date', help='Date to show progress for; leave empty to show today\'s progress')
     
-    summary_text = fields.Text(string='Summary', compute='_compute_summary', store=True)
+    summary_text = fields.Text(string='Summary', compute='_compute_summary')
+    completion_percentage = fields.Float(string='Completion %', compute='_compute_summary', digits=(5, 2))
+    schedule_variance = fields.Float(string='Variance', compute='_compute_summary', help='Remaining minus ideal remaining story points')
+    burndown_status = fields.Selection([
+        ('on_track', _('On Track')),
+        ('behind', _('Behind')),
+        ('ahead', _('Ahead')),
+    ], string='Status', compute='_compute_summary')
     
-    @api.depends('sprint_plan_id', 'chart_type', 'data_ids', 'current_date')
+    series_data = fields.Json(string='Series Data', readonly=True, copy=False)
+    series_etag = fields.Char(string='Series ETag', readonly=True, copy=False)
+    
+    @api.depends('sprint_plan_id', 'current_date')
     def _compute_summary(self):
+        latest_data = self._get_latest_data()
+        status_labels = dict(self._fields['burndown_status']._description_selection(self.env))
+        
         for record in self:
-            if not record.data_ids:
-                record.summary_text = ''
-                continue
-            
-            data = record.data_ids.sorted('date')
+            data = latest_data.get(record.id)
             if not data:
                 record.summary_text = ''
+                record.completion_percentage = 0.0
+                record.schedule_variance = 0.0
+                record.burndown_status = False
                 continue
             
-            total = data[0].total_story_points
-            remaining = data[-1].remaining_story_points
+            total, remaining, ideal_remaining, variance = data
             completed = total - remaining
             completion_percentage = (completed / total * 100) if total > 0 else 0
             
-            ideal_remaining = data[-1].ideal_remaining
-            variance = data[-1].variance
-            
-            status = 'On Track' if abs(variance) < (total * 0.1) else ('Behind' if variance > 0 else 'Ahead')
+            status = 'on_track' if abs(variance) < (total * 0.1) else ('behind' if variance > 0 else 'ahead')
             
-            summary = f"""Sprint Burndown Summary for {record.sprint_plan_id.name}:
+            record.completion_percentage = completion_percentage
+            record.schedule_variance = variance
+            record.burndown_status = status
+            record.summary_text = f"""Sprint Burndown Summary for {record.sprint_plan_id.name}:
     
 Total Work: {total:.1f} story points
 Completed: {completed:.1f} story points ({completion_percentage:.1f}%)
@@ -128,9 +286,32 @@ Remaining: {remaining:.1f} story points
     
 Ideal Remaining: {ideal_remaining:.1f} story points
 Variance: {variance:+.1f} story points
-Status: {status}
+Status: {status_labels[status]}
     """
-            record.summary_text = summary
+
+    def _get_latest_data(self):
+        # {chart id: (total, remaining, ideal remaining, variance)} of the last row on or before each chart's date
+        charts = self.filtered('sprint_plan_id')
+        if not charts:
+            return {}
+        
+        today = fields.Date.context_today(self)
+        keys = list(charts)
+        self.env['scrum.burndown_data'].flush_model()
+        values = ', '.join(['(%s, %s, %s::date)'] * len(keys))
+        self.env.cr.execute(f"""
+            SELECT v.key, d.total_story_points, d.remaining_story_points, d.ideal_remaining, d.variance
+              FROM (VALUES {values}) AS v(key, sprint_plan_id, as_of)
+              CROSS JOIN LATERAL (
+                    SELECT total_story_points, remaining_story_points, ideal_remaining, variance
+                      FROM scrum_burndown_data
+                     WHERE sprint_plan_id = v.sprint_plan_id
+                       AND date <= v.as_of
+                  ORDER BY date DESC
+                     LIMIT 1
+                   ) AS d
+        """, [value for key, chart in enumerate(keys) for value in (key, chart.sprint_plan_id.id, chart.current_date or today)])
+        return {keys[key].id: tuple(value or 0.0 for value in row) for key, *row in self.env.cr.fetchall()}
 
     def action_generate_burndown_data(self):
         self.ensure_one()
@@ -144,7 +325,7 @@ Status: {status}
         ])
         
         if existing_data:
-            raise UserError(_('Burndown data already exists for this sprint. Clear it first if you want to regenerate.'))
+            raise UserError(_('Burndown data already exists for this sprint. Use Regenerate to update it in place.'))
         
         self._generate_daily_data(sprint_plan)
         self._update_daily_progress(sprint_plan)
@@ -168,79 +349,132 @@ Status: {status}
             total_tasks += backlog.total_tasks
             total_hours += sum(task.estimated_hours for task in backlog.sprint_task_ids)
         
+        totals = {
+            'total_story_points': total_story_points,
+            'total_tasks': total_tasks,
+            'total_hours': total_hours,
+        }
+        
+        existing_data = self.env['scrum.burndown_data'].search([
+            ('sprint_plan_id', '=', sprint_plan.id)
+        ])
+        in_range = existing_data.filtered(lambda d: start_date <= d.date <= end_date)
+        
+        # days that fell out of the sprint when its dates moved; snapshots are history and stay
+        (existing_data - in_range).filtered(lambda d: not d.is_snapshot).unlink()
+        in_range.filtered(lambda d: not d.is_snapshot).write(totals)
+        
+        existing_dates = set(in_range.mapped('date'))
+        vals_list = []
         current_date = start_date
         while current_date <= end_date:
-            self.env['scrum.burndown_data'].create({
-                'sprint_plan_id': sprint_plan.id,
-                'date': current_date,
-                'total_story_points': total_story_points,
-                'total_tasks': total_tasks,
-                'total_hours': total_hours,
-                'remaining_story_points': total_story_points,
-                'remaining_tasks': total_tasks,
-                'remaining_hours': total_hours,
-            })
-            
+            if current_date not in existing_dates:
+                vals_list.append(dict(
+                    totals,
+                    sprint_plan_id=sprint_plan.id,
+                    date=current_date,
+                    remaining_story_points=total_story_points,
+                    remaining_tasks=total_tasks,
+                    remaining_hours=total_hours,
+                ))
             current_date += timedelta(days=1)
+        
+        self.env['scrum.burndown_data'].create(vals_list)
 
     def _update_daily_progress(self, sprint_plan):
         self.ensure_one()
         
         burndown_data = self.env['scrum.burndown_data'].search([
-            ('sprint_plan_id', '=', sprint_plan.id)
+            ('sprint_plan_id', '=', sprint_plan.id),
+            ('is_snapshot', '=', False),
         ], order='date asc')
         
         if not burndown_data:
             return
         
-        done_stage = self.env['scrum.sprint_stage'].search([('name', '=ilike', 'Done')], limit=1)
+        done_dates = self._get_task_done_dates(sprint_plan)
         
-        for data_point in burndown_data:
-            completed_story_points = 0.0
-            completed_tasks = 0
-            completed_hours = 0.0
+        completions = defaultdict(lambda: [0.0, 0, 0.0])
+        for backlog in sprint_plan.sprint_backlog_ids:
+            story_points_per_task = 0.0
+            if backlog.user_story_id and backlog.total_tasks > 0:
+                story_points_per_task = backlog.user_story_id.estimated_story_points / backlog.total_tasks
             
-            for backlog in sprint_plan.sprint_backlog_ids:
-                for task in backlog.sprint_task_ids:
-                    task_done_date = None
-                    
-                    if task.sprint_stage_id.id == done_stage.id if done_stage else False:
-                        task_done_date = self._get_task_done_date(task, data_point.date)
-                    
-                    if task_done_date and task_done_date <= data_point.date:
-                        completed_tasks += 1
-                        completed_hours += task.actual_hours if task.actual_hours else task.estimated_hours
-                        
-                        if backlog.user_story_id:
-                            completed_story_points += backlog.user_story_id.estimated_story_points / backlog.total_tasks if backlog.total_tasks > 0 else 0
+            for task in backlog.sprint_task_ids:
+                done_date = done_dates.get(task.id)
+                if not done_date:
+                    continue
+                completion = completions[done_date]
+                completion[0] += story_points_per_task
+                completion[1] += 1
+                completion[2] += task.actual_hours if task.actual_hours else task.estimated_hours
+        
+        done_days = sorted(completions)
+        index = 0
+        completed_story_points = 0.0
+        completed_tasks = 0
+        completed_hours = 0.0
+        
+        rows = []
+        for data_point in burndown_data:
+            while index < len(done_days) and done_days[index] <= data_point.date:
+                story_points, tasks, hours = completions[done_days[index]]
+                completed_story_points += story_points
+                completed_tasks += tasks
+                completed_hours += hours
+                index += 1
             
-            data_point.write({
-                'completed_tasks': completed_tasks,
-                'completed_hours': completed_hours,
-                'completed_story_points': completed_story_points,
-                'remaining_tasks': data_point.total_tasks - completed_tasks,
-                'remaining_hours': data_point.total_hours - completed_hours,
-                'remaining_story_points': data_point.total_story_points - completed_story_points,
-            })
+            rows.append((
+                data_point.id,
+                completed_story_points,
+                completed_tasks,
+                completed_hours,
+                data_point.total_story_points - completed_story_points,
+                data_point.total_tasks - completed_tasks,
+                data_point.total_hours - completed_hours,
+            ))
+        
+        burndown_data._write_progress_rows(rows)
 
-    def _get_task_done_date(self, task, date_limit):
+    def _get_task_done_dates(self, sprint_plan):
         self.ensure_one()
         
-        done_stage = self.env['scrum.sprint_stage'].search([('name', '=ilike', 'Done')], limit=1)
-        if not done_stage:
-            return None
+        done_stage_ids = self.env['scrum.sprint_stage']._get_done_stage_ids()
+        if not done_stage_ids:
+            return {}
+        
+        tasks = self.env['scrum.sprint_task'].search([
+            ('sprint_backlog_id.sprint_plan_id', '=', sprint_plan.id),
+            ('sprint_stage_id', 'in', done_stage_ids),
+        ])
+        if not tasks:
+            return {}
         
-        message = self.env['mail.message'].search([
-            ('res_id', '=', task.id),
-            ('model', '=', 'scrum.sprint_task'),
-            ('date', '<=', date_limit),
-            ('message_type', 'in', ['notification']),
-        ], order='date desc', limit=1)
+        done_dates = self.env['scrum.sprint_task_stage_history']._get_done_dates(tasks.ids, done_stage_ids)
         
-        if message and message.date:
-            return message.date.date()
+        # tasks completed before the stage history existed only have chatter to go by
+        legacy_task_ids = tuple(set(tasks.ids) - set(done_dates))
+        if legacy_task_ids:
+            self.env['mail.message'].flush_model(['model', 'res_id', 'date', 'message_type'])
+            self.env.cr.execute("""
+                SELECT res_id, MAX(date)
+                  FROM mail_message
+                 WHERE model = 'scrum.sprint_task'
+                   AND res_id IN %s
+                   AND message_type = 'notification'
+              GROUP BY res_id
+            """, [legacy_task_ids])
+            done_dates.update({task_id: message_date.date() for task_id, message_date in self.env.cr.fetchall() if message_date})
         
-        return None
+        return done_dates
+
+    def action_regenerate_burndown_data(self):
+        self.ensure_one()
+        if not self.sprint_plan_id:
+            raise UserError(_('Please select a Sprint Plan first.'))
+        
+        self._generate_daily_data(self.sprint_plan_id)
+        self.action_refresh_burndown_data()
 
     def action_refresh_burndown_data(self):
         self.ensure_one()
@@ -248,6 +482,7 @@ Status: {status}
             raise UserError(_('Please select a Sprint Plan first.'))
         
         self._update_daily_progress(self.sprint_plan_id)
+        self.sprint_plan_id.write({'burndown_dirty': False, 'burndown_dirty_date': False})
 
     def action_clear_burndown_data(self):
         self.ensure_one()
@@ -277,15 +512,45 @@ Status: {status}
     
     def get_burndown_chart_data(self):
         self.ensure_one()
-        burndown_data = self.data_ids.sorted('date')
-        
-        dates = [d.date.strftime('%Y-%m-%d') for d in burndown_data]
-        actual_remaining = [d.remaining_story_points for d in burndown_data]
-        ideal_remaining = [d.ideal_remaining for d in burndown_data]
+        series = self._get_series()
         
         return {
-            'dates': dates,
-            'actual_remaining': actual_remaining,
-            'ideal_remaining': ideal_remaining,
-            'total': burndown_data[0].total_story_points if burndown_data else 0,
-        }
\ No newline at end of file
+            'dates': series['dates'],
+            'actual_remaining': series['actual_remaining'],
+            'ideal_remaining': series['ideal_remaining'],
+            'total': series['total'],
+        }
+
+    def _get_series(self):
+        self.ensure_one()
+        if not self.series_etag:
+            self._build_series()
+        return self.series_data
+
+    def _get_series_etag(self):
+        self.ensure_one()
+        if not self.series_etag:
+            self._build_series()
+        return self.series_etag
+
+    def _build_series(self):
+        self.ensure_one()
+        self.env['scrum.burndown_data'].flush_model()
+        self.env.cr.execute("""
+            SELECT date, remaining_story_points, ideal_remaining, remaining_tasks, remaining_hours, total_story_points
+              FROM scrum_burndown_data
+             WHERE sprint_plan_id = %s
+          ORDER BY date
+        """, [self.sprint_plan_id.id])
+        rows = self.env.cr.fetchall()
+        
+        series = {
+            'dates': [row[0].strftime('%Y-%m-%d') for row in rows],
+            'actual_remaining': [row[1] for row in rows],
+            'ideal_remaining': [row[2] for row in rows],
+            'remaining_tasks': [row[3] for row in rows],
+            'remaining_hours': [row[4] for row in rows],
+            'total': rows[0][5] if rows else 0,
+        }
+        etag = hashlib.sha1(json.dumps(series, sort_keys=True).encode()).hexdigest()
+        self.sudo().write({'series_data': series, 'series_etag': etag})
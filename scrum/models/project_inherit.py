@@ -1,5 +1,12 @@
 # -*- coding: utf-8 -*-
+from collections import defaultdict
 from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+from ..tools import forecast
+
+AI_FEEDBACK_SUMMARY_ENTRIES = 5
+AI_FEEDBACK_SUMMARY_ENTRY_LIMIT = 1000
+AI_FEEDBACK_SUMMARY_LIMIT = 4000
 
 class ProjectProjectInherit(models.Model):
     _inherit = 'project.project'
@@ -29,65 +36,56 @@ class ProjectProjectInherit(models.Model):
     sprint_effectiveness_score = fields.Float(string='Sprint Effectiveness Score', digits=(5, 2), compute='_compute_quality_metrics', store=True)
     
     last_analysis_date = fields.Datetime(string='Last Analysis Date', compute='_compute_last_analysis', store=True)
-    ai_feedback_summary = fields.Text(string='AI Feedback Summary', compute='_compute_ai_feedback_summary')
+    ai_feedback_summary = fields.Text(string='AI Feedback Summary', compute='_compute_ai_feedback_summary', store=True)
     
     auto_analyze = fields.Boolean(string='Auto Analyze on Sprint Completion', default=False)
     minimum_quality_threshold = fields.Float(string='Minimum Quality Threshold', default=70.0, help='Minimum quality score required for project to pass')
     
     quality_passed = fields.Boolean(string='Quality Passed', compute='_compute_quality_passed', store=True)
     
-    @api.depends('team_ids', 'team_ids.sprint_plan_ids')
-    def _compute_sprint_count(self):
-        for record in self:
-            record.sprint_count = sum(len(team.sprint_plan_ids) for team in record.team_ids)
-    
-    @api.depends('team_ids', 'team_ids.team_member_ids')
-    def _compute_team_member_count(self):
+    @api.depends('team_ids', 'team_ids.sprint_plan_ids', 'team_ids.sprint_plan_ids.status', 'team_ids.team_member_ids')
+    def _compute_scrum_counts(self):
+        teams = self.team_ids
+        sprint_counts = defaultdict(int)
+        active_sprint_counts = defaultdict(int)
+        member_counts = defaultdict(int)
+        if teams.ids:
+            for team, status, count in self.env['scrum.sprint_plan']._read_group(
+                [('team_id', 'in', teams.ids)], ['team_id', 'status'], ['__count'],
+            ):
+                sprint_counts[team.id] += count
+                if status == 'in_progress':
+                    active_sprint_counts[team.id] += count
+            for team, count in self.env['scrum.team_member']._read_group(
+                [('team_id', 'in', teams.ids)], ['team_id'], ['__count'],
+            ):
+                member_counts[team.id] = count
+        
         for record in self:
-            record.team_member_count = sum(len(team.team_member_ids) for team in record.team_ids)
+            team_ids = record.team_ids.ids
+            record.sprint_count = sum(sprint_counts[team_id] for team_id in team_ids)
+            record.team_member_count = sum(member_counts[team_id] for team_id in team_ids)
+            record.active_sprint_count = sum(active_sprint_counts[team_id] for team_id in team_ids)
     
-    @api.depends('team_ids', 'team_ids.sprint_plan_ids', 'team_ids.sprint_plan_ids.status')
-    def _compute_active_sprint_count(self):
-        for record in self:
-            record.active_sprint_count = sum(
-                1 for team in record.team_ids
-                for sprint in team.sprint_plan_ids
-                if sprint.status == 'in_progress'
-            )
-    
-    @api.depends('ai_analysis_ids', 'ai_analysis_ids.score', 'ai_analysis_ids.status', 'ai_analysis_ids.approval_status')
+    @api.depends('ai_analysis_ids', 'ai_analysis_ids.score', 'ai_analysis_ids.status', 'ai_analysis_ids.approval_status', 'ai_analysis_ids.analysis_type')
     def _compute_quality_metrics(self):
+        analysis_model = self.env['scrum.ai_analysis']
+        scores = defaultdict(dict)
+        if self.ids:
+            for project, analysis_type, score in analysis_model._read_group(
+                [('project_id', 'in', self.ids), ('status', '=', 'completed'), ('approval_status', '=', 'approved')],
+                ['project_id', 'analysis_type'],
+                ['score:avg'],
+            ):
+                scores[project.id][analysis_type] = score or 0.0
+        
         for record in self:
-            analyses = record.ai_analysis_ids.filtered(lambda a: a.status == 'completed' and a.approval_status == 'approved')
-            
-            if not analyses:
-                record.overall_quality_score = 0.0
-                record.overall_grade = 'E'
-                record.requirement_compliance_score = 0.0
-                record.code_quality_score = 0.0
-                record.sprint_effectiveness_score = 0.0
-                continue
-            
-            quality_scores = analyses.filtered(lambda a: a.analysis_type == 'quality').mapped('score')
-            requirement_scores = analyses.filtered(lambda a: a.analysis_type == 'requirement').mapped('score')
-            code_scores = analyses.filtered(lambda a: a.analysis_type == 'code_review').mapped('score')
-            sprint_scores = analyses.filtered(lambda a: a.analysis_type == 'sprint_review').mapped('score')
-            
-            record.overall_quality_score = sum(quality_scores) / len(quality_scores) if quality_scores else 0.0
-            record.requirement_compliance_score = sum(requirement_scores) / len(requirement_scores) if requirement_scores else 0.0
-            record.code_quality_score = sum(code_scores) / len(code_scores) if code_scores else 0.0
-            record.sprint_effectiveness_score = sum(sprint_scores) / len(sprint_scores) if sprint_scores else 0.0
-            
-            if record.overall_quality_score >= 90:
-                record.overall_grade = 'A'
-            elif record.overall_quality_score >= 80:
-                record.overall_grade = 'B'
-            elif record.overall_quality_score >= 70:
-                record.overall_grade = 'C'
-            elif record.overall_quality_score >= 60:
-                record.overall_grade = 'D'
-            else:
-                record.overall_grade = 'E'
+            project_scores = scores.get(record.id, {})
+            record.overall_quality_score = project_scores.get('quality', 0.0)
+            record.requirement_compliance_score = project_scores.get('requirement', 0.0)
+            record.code_quality_score = project_scores.get('code_review', 0.0)
+            record.sprint_effectiveness_score = project_scores.get('sprint_review', 0.0)
+            record.overall_grade = analysis_model._get_grade(record.overall_quality_score)
     
     @api.depends('ai_analysis_ids', 'ai_analysis_ids.analyzed_date')
     def _compute_last_analysis(self):
@@ -95,26 +93,81 @@ class ProjectProjectInherit(models.Model):
             analyses = record.ai_analysis_ids.filtered(lambda a: a.analyzed_date)
             record.last_analysis_date = max(analyses.mapped('analyzed_date')) if analyses else False
     
-    @api.depends('ai_analysis_ids', 'ai_analysis_ids.ai_feedback')
+    @api.depends('ai_analysis_ids', 'ai_analysis_ids.ai_feedback', 'ai_analysis_ids.status', 'ai_analysis_ids.approval_status', 'ai_analysis_ids.analyzed_date')
     def _compute_ai_feedback_summary(self):
+        feedback = defaultdict(list)
+        if self.ids:
+            self.env['scrum.ai_analysis'].flush_model(['project_id', 'ai_feedback', 'status', 'approval_status', 'analyzed_date'])
+            self.env.cr.execute("""
+                SELECT project_id, LEFT(ai_feedback, %(entry_limit)s), LENGTH(ai_feedback) > %(entry_limit)s
+                  FROM (
+                        SELECT project_id, ai_feedback,
+                               ROW_NUMBER() OVER (PARTITION BY project_id ORDER BY analyzed_date DESC NULLS LAST, id DESC) AS rank
+                          FROM scrum_ai_analysis
+                         WHERE project_id IN %(project_ids)s
+                           AND status = 'completed'
+                           AND approval_status = 'approved'
+                           AND COALESCE(ai_feedback, '') != ''
+                       ) AS latest
+                 WHERE rank <= %(entries)s
+              ORDER BY project_id, rank
+            """, {
+                'project_ids': tuple(self.ids),
+                'entry_limit': AI_FEEDBACK_SUMMARY_ENTRY_LIMIT,
+                'entries': AI_FEEDBACK_SUMMARY_ENTRIES,
+            })
+            for project_id, text, truncated in self.env.cr.fetchall():
+                feedback[project_id].append(text.rstrip() + '…' if truncated else text)
+        
         for record in self:
-            recent_analyses = record.ai_analysis_ids.search([
-                ('project_id', '=', record.id),
-                ('status', '=', 'completed'),
-                ('approval_status', '=', 'approved')
-            ], order='analyzed_date desc', limit=5)
-            
-            feedback_list = [a.ai_feedback for a in recent_analyses if a.ai_feedback]
-            record.ai_feedback_summary = '\n\n'.join(feedback_list) if feedback_list else ''
+            summary = '\n\n'.join(feedback.get(record.id, []))
+            if len(summary) > AI_FEEDBACK_SUMMARY_LIMIT:
+                summary = summary[:AI_FEEDBACK_SUMMARY_LIMIT].rstrip() + '…'
+            record.ai_feedback_summary = summary
     
     @api.depends('overall_quality_score', 'minimum_quality_threshold')
     def _compute_quality_passed(self):
         for record in self:
             record.quality_passed = record.overall_quality_score >= record.minimum_quality_threshold if record.overall_quality_score > 0 else False
     
-    sprint_count = fields.Integer(string='Sprint Count', compute='_compute_sprint_count', store=True)
-    team_member_count = fields.Integer(string='Team Member Count', compute='_compute_team_member_count', store=True)
-    active_sprint_count = fields.Integer(string='Active Sprint Count', compute='_compute_active_sprint_count', store=True)
+    sprint_count = fields.Integer(string='Sprint Count', compute='_compute_scrum_counts', store=True)
+    team_member_count = fields.Integer(string='Team Member Count', compute='_compute_scrum_counts', store=True)
+    active_sprint_count = fields.Integer(string='Active Sprint Count', compute='_compute_scrum_counts', store=True)
+    
+    release_forecast_p50_date = fields.Date(string='Release Forecast (P50)', readonly=True, copy=False)
+    release_forecast_p85_date = fields.Date(string='Release Forecast (P85)', readonly=True, copy=False)
+    release_forecast_p95_date = fields.Date(string='Release Forecast (P95)', readonly=True, copy=False)
+    release_forecast_date = fields.Datetime(string='Release Forecast Computed On', readonly=True, copy=False)
+    
+    def action_forecast_release(self):
+        if forecast.np is None:
+            raise UserError(_('The numpy Python library is required for completion forecasts.'))
+        self._update_release_forecast()
+    
+    def _update_release_forecast(self):
+        if forecast.np is None or not self:
+            return
+        sprint_plan_model = self.env['scrum.sprint_plan']
+        samples = sprint_plan_model._get_daily_throughput('project_id', self.ids)
+        remaining = {
+            project.id: story_points
+            for project, story_points in self.env['scrum.user_story']._read_group(
+                [('project_id', 'in', self.ids), ('status', '!=', 'done')],
+                ['project_id'], ['estimated_story_points:sum'],
+            )
+        }
+        runs = sprint_plan_model._get_forecast_runs()
+        today = fields.Date.context_today(self)
+        now = fields.Datetime.now()
+        
+        for record in self:
+            result = forecast.completion_percentiles(samples.get(record.id, []), remaining.get(record.id, 0.0), runs=runs)
+            record.write({
+                'release_forecast_p50_date': forecast.percentile_date(today, result, 50),
+                'release_forecast_p85_date': forecast.percentile_date(today, result, 85),
+                'release_forecast_p95_date': forecast.percentile_date(today, result, 95),
+                'release_forecast_date': now,
+            })
     
     def action_analyze_project_quality(self):
         self.ensure_one()
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+from odoo import models, fields, tools, _
+
+
+class ScrumReport(models.Model):
+    _name = 'scrum.report'
+    _description = 'Scrum Analysis Report'
+    _auto = False
+    _order = 'start_date desc, sprint_plan_id, sprint_backlog_id'
+
+    task_id = fields.Many2one('scrum.sprint_task', string='Sprint Task', readonly=True)
+    sprint_backlog_id = fields.Many2one('scrum.sprint_backlog', string='Sprint Backlog', readonly=True)
+    user_story_id = fields.Many2one('scrum.user_story', string='User Story', readonly=True)
+    sprint_plan_id = fields.Many2one('scrum.sprint_plan', string='Sprint Plan', readonly=True)
+    team_id = fields.Many2one('scrum.team', string='Team', readonly=True)
+    project_id = fields.Many2one('project.project', string='Project', readonly=True)
+    sprint_stage_id = fields.Many2one('scrum.sprint_stage', string='Sprint Stage', readonly=True)
+    assigned_to = fields.Many2one('scrum.team_member', string='Assigned To', readonly=True)
+    sprint_status = fields.Selection([
+        ('planning', _('Planning')),
+        ('in_progress', _('In Progress')),
+        ('completed', _('Completed')),
+        ('cancelled', _('Cancelled')),
+    ], string='Sprint Status', readonly=True)
+    start_date = fields.Date(string='Sprint Start Date', readonly=True)
+    end_date = fields.Date(string='Sprint End Date', readonly=True)
+    is_done = fields.Boolean(string='Done', readonly=True)
+
+    story_points = fields.Float(string='Story Points', readonly=True)
+    completed_story_points = fields.Float(string='Completed Story Points', readonly=True)
+    estimated_hours = fields.Float(string='Estimated Hours', readonly=True)
+    actual_hours = fields.Float(string='Actual Hours', readonly=True)
+    task_count = fields.Integer(string='# Tasks', readonly=True)
+    completed_task_count = fields.Integer(string='# Completed Tasks', readonly=True)
+    completion_rate = fields.Float(string='Completion %', readonly=True, aggregator='avg')
+
+    def init(self):
+        # one row per task, plus one row for each backlog without tasks so that its
+        # story points still count (as in _get_burndown_totals)
+        tools.drop_view_if_exists(self.env.cr, self._table)
+        self.env.cr.execute(f"""
+            CREATE OR REPLACE VIEW {self._table} AS (
+                SELECT ROW_NUMBER() OVER (ORDER BY b.id, t.id) AS id,
+                       t.id AS task_id,
+                       b.id AS sprint_backlog_id,
+                       b.user_story_id,
+                       b.sprint_plan_id,
+                       p.team_id,
+                       p.project_id,
+                       t.sprint_stage_id,
+                       t.assigned_to,
+                       p.status AS sprint_status,
+                       p.start_date,
+                       p.end_date,
+                       COALESCE(st.is_done, FALSE) AS is_done,
+                       COALESCE(s.estimated_story_points, 0)
+                           / GREATEST(COUNT(t.id) OVER (PARTITION BY b.id), 1) AS story_points,
+                       CASE WHEN st.is_done
+                            THEN COALESCE(s.estimated_story_points, 0) / COUNT(t.id) OVER (PARTITION BY b.id)
+                            ELSE 0 END AS completed_story_points,
+                       COALESCE(t.estimated_hours, 0) AS estimated_hours,
+                       COALESCE(t.actual_hours, 0) AS actual_hours,
+                       CASE WHEN t.id IS NULL THEN 0 ELSE 1 END AS task_count,
+                       CASE WHEN st.is_done THEN 1 ELSE 0 END AS completed_task_count,
+                       CASE WHEN st.is_done THEN 100.0 ELSE 0.0 END AS completion_rate
+                  FROM scrum_sprint_backlog b
+                  JOIN scrum_sprint_plan p ON p.id = b.sprint_plan_id
+             LEFT JOIN scrum_sprint_task t ON t.sprint_backlog_id = b.id
+             LEFT JOIN scrum_user_story s ON s.id = b.user_story_id
+             LEFT JOIN scrum_sprint_stage st ON st.id = t.sprint_stage_id
+            )
+        """)
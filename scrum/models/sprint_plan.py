@@ -1,6 +1,10 @@
 # -*- coding: utf-8 -*-
 import logging
+from collections import defaultdict
+from datetime import timedelta
 from odoo import models, fields, api,_
+from odoo.exceptions import UserError
+from ..tools import forecast
 
 _logger = logging.getLogger(__name__)
 
@@ -35,12 +39,22 @@ class ScrumSprintPlan(models.Model):
                 ], order='iteration_number desc', limit=1).iteration_number
                 vals['iteration_number'] = (max_iteration or 0) + 1
         return super().create(vals)
+
+    def write(self, vals):
+        result = super().write(vals)
+        if 'start_date' in vals or 'end_date' in vals:
+            self.filtered('has_burndown_chart')._regenerate_burndown_data()
+        return result
     
     @api.depends('sprint_backlog_ids', 'sprint_backlog_ids.status', 'daily_meeting_ids', 'daily_meeting_ids.status', 'sprint_review_meeting_ids', 'sprint_review_meeting_ids.status', 'iteration_review_meeting_ids', 'iteration_review_meeting_ids.status')
     def _compute_progress_summary(self):
+        backlog_counts = self._get_status_counts('sprint_backlog_ids')
+        daily_meeting_counts = self._get_status_counts('daily_meeting_ids')
+        review_meeting_counts = self._get_status_counts('sprint_review_meeting_ids')
+        retrospective_meeting_counts = self._get_status_counts('iteration_review_meeting_ids')
+        
         for record in self:
-            sprint_backlogs = record.sprint_backlog_ids
-            total_backlogs = len(sprint_backlogs)
+            total_backlogs = sum(backlog_counts[record.id].values())
             
             if total_backlogs == 0:
                 record.completed_backlogs = 0
@@ -51,17 +65,31 @@ class ScrumSprintPlan(models.Model):
                 record.completed_retrospective_meetings = 0
                 continue
             
-            completed_backlogs = sum(1 for sb in sprint_backlogs if sb.status == 'completed')
-            completed_daily_meetings = sum(1 for dm in record.daily_meeting_ids if dm.status == 'completed')
-            completed_review_meetings = sum(1 for rm in record.sprint_review_meeting_ids if rm.status == 'completed')
-            completed_retrospective_meetings = sum(1 for im in record.iteration_review_meeting_ids if im.status == 'completed')
+            completed_backlogs = backlog_counts[record.id]['completed']
             
             record.completed_backlogs = completed_backlogs
             record.total_backlogs = total_backlogs
             record.backlog_completion_percentage = (completed_backlogs / total_backlogs * 100) if total_backlogs > 0 else 0.0
-            record.completed_daily_meetings = completed_daily_meetings
-            record.completed_review_meetings = completed_review_meetings
-            record.completed_retrospective_meetings = completed_retrospective_meetings
+            record.completed_daily_meetings = daily_meeting_counts[record.id]['completed']
+            record.completed_review_meetings = review_meeting_counts[record.id]['completed']
+            record.completed_retrospective_meetings = retrospective_meeting_counts[record.id]['completed']
+    
+    def _get_status_counts(self, field_name):
+        # {plan id: {status: count}} of a one2many, in one grouped query for the recordset
+        field = self._fields[field_name]
+        counts = defaultdict(lambda: defaultdict(int))
+        stored = self.filtered('id')
+        if stored:
+            for plan, status, count in self.env[field.comodel_name]._read_group(
+                [(field.inverse_name, 'in', stored.ids)],
+                [field.inverse_name, 'status'],
+                ['__count'],
+            ):
+                counts[plan.id][status] += count
+        for record in self - stored:
+            for line in record[field_name]:
+                counts[record.id][line.status] += 1
+        return counts
     
     @api.constrains('status')
     def _check_status_transition(self):
@@ -107,6 +135,9 @@ class ScrumSprintPlan(models.Model):
         except Exception as e:
             _logger.warning('Auto AI analysis failed for sprint %s: %s', self.name, e)
     
+    def action_batch_sprint_review(self):
+        return self.env['scrum.ai_analysis']._queue_batch_analyses(self, 'sprint_review')
+    
     def action_create_burndown_chart(self):
         self.ensure_one()
         return {
@@ -153,4 +184,173 @@ class ScrumSprintPlan(models.Model):
             record.has_burndown_chart = bool(record.burndown_chart_ids)
     
     has_burndown_chart = fields.Boolean(string='Has Burndown Chart', compute='_compute_has_burndown_chart', store=True)
+    burndown_dirty = fields.Boolean(string='Burndown Outdated', default=False, copy=False, readonly=True)
+    burndown_dirty_date = fields.Datetime(string='Burndown Outdated Since', copy=False, readonly=True)
+
+    def _mark_burndown_dirty(self):
+        plans = self.filtered(lambda p: p.has_burndown_chart and not p.burndown_dirty)
+        if not plans:
+            return
+        now = fields.Datetime.now()
+        # task users may only read sprint plans; the flag is bookkeeping, so set it
+        # in SQL and only on plans not already flagged to keep the row locks rare
+        plans.flush_recordset(['burndown_dirty', 'burndown_dirty_date'])
+        self.env.cr.execute("""
+            UPDATE scrum_sprint_plan
+               SET burndown_dirty = TRUE, burndown_dirty_date = %s
+             WHERE id IN %s AND NOT COALESCE(burndown_dirty, FALSE)
+        """, [now, tuple(plans.ids)])
+        plans.invalidate_recordset(['burndown_dirty', 'burndown_dirty_date'])
+        cron = self.env.ref('scrum.ir_cron_refresh_burndown_data', raise_if_not_found=False)
+        if cron:
+            cron.sudo()._trigger(at=now + timedelta(seconds=self._get_burndown_refresh_delay()))
+
+    @api.model
+    def _get_burndown_refresh_delay(self):
+        return int(self.env['ir.config_parameter'].sudo().get_param('scrum.burndown_refresh_delay', 60))
+
+    def _get_burndown_totals(self):
+        if not self:
+            return {}
+        done_stage_ids = list(self.env['scrum.sprint_stage']._get_done_stage_ids())
+        for model in ('scrum.sprint_backlog', 'scrum.sprint_task', 'scrum.user_story'):
+            self.env[model].flush_model()
+        self.env.cr.execute("""
+            WITH task_stats AS (
+                SELECT t.sprint_backlog_id,
+                       COUNT(*) AS total_tasks,
+                       COUNT(*) FILTER (WHERE t.sprint_stage_id = ANY(%(done_stage_ids)s)) AS completed_tasks,
+                       SUM(COALESCE(t.estimated_hours, 0)) AS total_hours,
+                       SUM(CASE WHEN t.sprint_stage_id = ANY(%(done_stage_ids)s)
+                                THEN COALESCE(NULLIF(t.actual_hours, 0), t.estimated_hours, 0)
+                                ELSE 0 END) AS completed_hours
+                  FROM scrum_sprint_task t
+                  JOIN scrum_sprint_backlog b ON b.id = t.sprint_backlog_id
+                 WHERE b.sprint_plan_id IN %(plan_ids)s
+              GROUP BY t.sprint_backlog_id
+            )
+            SELECT b.sprint_plan_id,
+                   SUM(COALESCE(s.estimated_story_points, 0)),
+                   SUM(CASE WHEN ts.total_tasks > 0
+                            THEN COALESCE(s.estimated_story_points, 0) * ts.completed_tasks / ts.total_tasks
+                            ELSE 0 END),
+                   SUM(COALESCE(ts.total_tasks, 0)),
+                   SUM(COALESCE(ts.completed_tasks, 0)),
+                   SUM(COALESCE(ts.total_hours, 0)),
+                   SUM(COALESCE(ts.completed_hours, 0))
+              FROM scrum_sprint_backlog b
+         LEFT JOIN scrum_user_story s ON s.id = b.user_story_id
+         LEFT JOIN task_stats ts ON ts.sprint_backlog_id = b.id
+             WHERE b.sprint_plan_id IN %(plan_ids)s
+          GROUP BY b.sprint_plan_id
+        """, {'plan_ids': tuple(self.ids), 'done_stage_ids': done_stage_ids})
+        return {
+            plan_id: {
+                'total_story_points': total_story_points,
+                'completed_story_points': completed_story_points,
+                'total_tasks': total_tasks,
+                'completed_tasks': completed_tasks,
+                'total_hours': total_hours,
+                'completed_hours': completed_hours,
+            }
+            for plan_id, total_story_points, completed_story_points, total_tasks, completed_tasks, total_hours, completed_hours
+            in self.env.cr.fetchall()
+        }
+
+    def _regenerate_burndown_data(self):
+        for plan in self:
+            chart = plan.burndown_chart_ids[:1]
+            has_data = self.env['scrum.burndown_data'].search_count([('sprint_plan_id', '=', plan.id)], limit=1)
+            if chart and has_data:
+                chart._generate_daily_data(plan)
+        self._refresh_burndown_data()
+
+    def _refresh_burndown_data(self):
+        for plan in self:
+            chart = plan.burndown_chart_ids[:1]
+            if chart:
+                chart._update_daily_progress(plan)
+        self.write({'burndown_dirty': False, 'burndown_dirty_date': False})
 
+    @api.model
+    def _cron_refresh_burndown_data(self):
+        threshold = fields.Datetime.now() - timedelta(seconds=self._get_burndown_refresh_delay())
+        plans = self.search([
+            ('burndown_dirty', '=', True),
+            ('burndown_dirty_date', '<=', threshold),
+        ])
+        for plan in plans:
+            try:
+                with self.env.cr.savepoint():
+                    plan._refresh_burndown_data()
+            except Exception:
+                _logger.exception('Failed to refresh burndown data for sprint %s', plan.name)
+
+    forecast_p50_date = fields.Date(string='Forecast Completion (P50)', readonly=True, copy=False)
+    forecast_p85_date = fields.Date(string='Forecast Completion (P85)', readonly=True, copy=False)
+    forecast_p95_date = fields.Date(string='Forecast Completion (P95)', readonly=True, copy=False)
+    forecast_date = fields.Datetime(string='Forecast Computed On', readonly=True, copy=False)
+
+    @api.model
+    def _get_forecast_runs(self):
+        return int(self.env['ir.config_parameter'].sudo().get_param('scrum.forecast_runs', 10000))
+
+    @api.model
+    def _get_daily_throughput(self, group_field, group_ids):
+        # daily completed story points of finished sprints, grouped by team or project
+        if not group_ids:
+            return {}
+        self.env['scrum.burndown_data'].flush_model(['sprint_plan_id', 'date', 'completed_story_points'])
+        self.flush_model([group_field, 'status'])
+        self.env.cr.execute(f"""
+            SELECT grouped.group_id, SUM(grouped.throughput)
+              FROM (
+                    SELECT p.{group_field} AS group_id,
+                           d.date,
+                           d.completed_story_points
+                           - COALESCE(LAG(d.completed_story_points) OVER (PARTITION BY d.sprint_plan_id ORDER BY d.date), 0)
+                           AS throughput
+                      FROM scrum_burndown_data d
+                      JOIN scrum_sprint_plan p ON p.id = d.sprint_plan_id
+                     WHERE p.{group_field} IN %s
+                       AND p.status = 'completed'
+                   ) AS grouped
+          GROUP BY grouped.group_id, grouped.date
+        """, [tuple(group_ids)])
+        samples = {}
+        for group_id, throughput in self.env.cr.fetchall():
+            samples.setdefault(group_id, []).append(throughput)
+        return samples
+
+    def action_forecast_completion(self):
+        if forecast.np is None:
+            raise UserError(_('The numpy Python library is required for completion forecasts.'))
+        self._update_completion_forecast()
+
+    def _update_completion_forecast(self):
+        if forecast.np is None or not self:
+            return
+        samples = self._get_daily_throughput('team_id', self.team_id.ids)
+        totals = self._get_burndown_totals()
+        runs = self._get_forecast_runs()
+        today = fields.Date.context_today(self)
+        now = fields.Datetime.now()
+        
+        for plan in self:
+            plan_totals = totals.get(plan.id, {})
+            remaining = plan_totals.get('total_story_points', 0.0) - plan_totals.get('completed_story_points', 0.0)
+            result = forecast.completion_percentiles(samples.get(plan.team_id.id, []), remaining, runs=runs)
+            plan.write({
+                'forecast_p50_date': forecast.percentile_date(today, result, 50),
+                'forecast_p85_date': forecast.percentile_date(today, result, 85),
+                'forecast_p95_date': forecast.percentile_date(today, result, 95),
+                'forecast_date': now,
+            })
+
+    @api.model
+    def _cron_update_forecasts(self):
+        if forecast.np is None:
+            return
+        sprint_plans = self.search([('status', '=', 'in_progress')])
+        sprint_plans._update_completion_forecast()
+        sprint_plans.project_id._update_release_forecast()
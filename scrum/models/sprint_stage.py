@@ -1,5 +1,5 @@
 # -*- coding: utf-8 -*-
-from odoo import models, fields, api, _
+from odoo import models, fields, api, tools, _
 
 class ScrumSprintStage(models.Model):
     _name = 'scrum.sprint_stage'
@@ -10,4 +10,37 @@ class ScrumSprintStage(models.Model):
     sequence = fields.Integer(string='Sequence', default=10)
     active = fields.Boolean(string='Active', default=True)
     color = fields.Integer(string='Color', export_string_translation=False)
+    is_done = fields.Boolean(string='Done Stage', default=False, help='Tasks in this stage count as completed in progress and burndown figures.')
+    is_closed = fields.Boolean(string='Closed Stage', default=False, help='Tasks in this stage are no longer worked on.')
 
+    @api.onchange('is_done')
+    def _onchange_is_done(self):
+        if self.is_done:
+            self.is_closed = True
+
+    @api.model
+    @tools.ormcache()
+    def _get_done_stage_ids(self):
+        return tuple(self.with_context(active_test=False).search([('is_done', '=', True)]).ids)
+
+    @api.model
+    @tools.ormcache()
+    def _get_closed_stage_ids(self):
+        return tuple(self.with_context(active_test=False).search([('is_closed', '=', True)]).ids)
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        self.env.registry.clear_cache()
+        return records
+
+    def write(self, vals):
+        result = super().write(vals)
+        if 'is_done' in vals or 'is_closed' in vals:
+            self.env.registry.clear_cache()
+        return result
+
+    def unlink(self):
+        result = super().unlink()
+        self.env.registry.clear_cache()
+        return result
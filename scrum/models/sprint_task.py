@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+from collections import defaultdict
 from datetime import datetime
 from odoo import models, fields, api,_
 
@@ -27,7 +28,7 @@ class ScrumSprintTask(models.Model):
     
     @api.onchange('sprint_stage_id')
     def _onchange_sprint_stage_id(self):
-        if self.sprint_stage_id and self.sprint_stage_id.name.lower() == 'done':
+        if self.sprint_stage_id and self.sprint_stage_id.is_done:
             if not self.actual_hours:
                 self.actual_hours = self.estimated_hours
 
@@ -38,29 +39,96 @@ class ScrumSprintTask(models.Model):
 
     project_id = fields.Many2one('project.project', string='Project', related='sprint_backlog_id.project_id', store=True, readonly=True)
     team_member_ids = fields.Many2many('scrum.team_member', string='Team Members', domain="[('team_id', '=', team_id)]")
+    stage_history_ids = fields.One2many('scrum.sprint_task_stage_history', 'task_id', string='Stage History', readonly=True)
     
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        self.env['scrum.sprint_task_stage_history']._record_transitions(records)
+        return records
+
     def write(self, vals):
+        old_stages = {}
+        if 'sprint_stage_id' in vals:
+            old_stages = {record.id: record.sprint_stage_id.id for record in self}
         result = super().write(vals)
         if 'sprint_stage_id' in vals:
-            for record in self:
-                if record.user_story_id and vals['sprint_stage_id'] != record.sprint_stage_id.id:
-                    done_stage = self.env['scrum.sprint_stage'].search([('name', '=ilike', 'Done')], limit=1)
-                    if done_stage and vals['sprint_stage_id'] == done_stage.id and not record.actual_hours:
-                        record.actual_hours = record.estimated_hours
-                    
-                    if record.sprint_backlog_id and record.sprint_backlog_id.sprint_plan_id:
-                        self._update_burndown_data(record.sprint_backlog_id.sprint_plan_id)
+            moved = self.filtered(lambda r: old_stages.get(r.id) != r.sprint_stage_id.id)
+            self.env['scrum.sprint_task_stage_history']._record_transitions(moved, old_stages)
+            done_stage_ids = self.env['scrum.sprint_stage']._get_done_stage_ids()
+            for record in moved:
+                if record.user_story_id and record.sprint_stage_id.id in done_stage_ids and not record.actual_hours:
+                    record.actual_hours = record.estimated_hours
+            if done_stage_ids and self._is_burndown_incremental():
+                moved._update_burndown_incrementally(old_stages, done_stage_ids)
+            else:
+                moved.sprint_backlog_id.sprint_plan_id._mark_burndown_dirty()
         return result
+
+    def action_batch_analyze_quality(self):
+        return self.env['scrum.ai_analysis']._queue_batch_analyses(self, 'quality')
     
-    def _update_burndown_data(self, sprint_plan):
+    def action_batch_analyze_requirements(self):
+        return self.env['scrum.ai_analysis']._queue_batch_analyses(self, 'requirement')
+    
+    @api.model
+    def _get_completion_counts(self, parent_field, parents):
+        # {parent id: (total tasks, completed tasks)} in one grouped query; records
+        # without a database id (onchange) are counted from the cache instead
+        done_stage_ids = self.env['scrum.sprint_stage']._get_done_stage_ids()
+        counts = {}
+        stored = parents.filtered('id')
+        if stored:
+            for parent, stage, count in self._read_group(
+                [(parent_field, 'in', stored.ids)],
+                [parent_field, 'sprint_stage_id'],
+                ['__count'],
+            ):
+                total, completed = counts.get(parent.id, (0, 0))
+                counts[parent.id] = (total + count, completed + (count if stage.id in done_stage_ids else 0))
+        for parent in parents - stored:
+            tasks = parent.sprint_task_ids
+            counts[parent.id] = (len(tasks), len(tasks.filtered(lambda t: t.sprint_stage_id.id in done_stage_ids)))
+        return counts
+
+    @api.model
+    def _is_burndown_incremental(self):
+        param = self.env['ir.config_parameter'].sudo().get_param('scrum.burndown_incremental', 'True')
+        return param.lower() not in ('0', 'false', 'no')
+
+    def _get_burndown_contribution(self):
         self.ensure_one()
+        backlog = self.sprint_backlog_id
+        story_points = 0.0
+        if backlog.user_story_id and backlog.total_tasks > 0:
+            story_points = backlog.user_story_id.estimated_story_points / backlog.total_tasks
+        hours = self.actual_hours if self.actual_hours else self.estimated_hours
+        return story_points, hours
+
+    def _update_burndown_incrementally(self, old_stages, done_stage_ids):
+        entered = self.filtered(lambda t: t.sprint_stage_id.id in done_stage_ids and old_stages.get(t.id) not in done_stage_ids)
+        left = self.filtered(lambda t: t.sprint_stage_id.id not in done_stage_ids and old_stages.get(t.id) in done_stage_ids)
+        if not entered and not left:
+            return
+        
+        previous_done_dates = self.env['scrum.sprint_task_stage_history']._get_done_dates(left.ids, done_stage_ids)
         
-        burndown_charts = self.env['scrum.burndown_chart'].search([
-            ('sprint_plan_id', '=', sprint_plan.id)
-        ])
+        today = fields.Datetime.now().date()
+        deltas = defaultdict(lambda: [0.0, 0, 0.0])
+        unresolved = self.browse()
+        for task, sign in [(task, 1) for task in entered] + [(task, -1) for task in left]:
+            sprint_plan = task.sprint_backlog_id.sprint_plan_id
+            if not sprint_plan:
+                continue
+            done_date = today if sign > 0 else previous_done_dates.get(task.id)
+            if not done_date:
+                unresolved |= task
+                continue
+            story_points, hours = task._get_burndown_contribution()
+            delta = deltas[(sprint_plan.id, done_date)]
+            delta[0] += sign * story_points
+            delta[1] += sign
+            delta[2] += sign * hours
         
-        for chart in burndown_charts:
-            try:
-                chart._update_daily_progress(sprint_plan)
-            except Exception as e:
-                pass
+        self.env['scrum.burndown_data']._apply_progress_deltas(deltas)
+        unresolved.sprint_backlog_id.sprint_plan_id._mark_burndown_dirty()
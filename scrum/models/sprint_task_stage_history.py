@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+from odoo import models, fields, api, tools, _
+from odoo.exceptions import UserError
+
+
+class ScrumSprintTaskStageHistory(models.Model):
+    _name = 'scrum.sprint_task_stage_history'
+    _description = 'Scrum Sprint Task Stage History'
+    _order = 'date desc, id desc'
+    _log_access = False
+
+    task_id = fields.Many2one('scrum.sprint_task', string='Sprint Task', required=True, ondelete='cascade', readonly=True)
+    sprint_backlog_id = fields.Many2one('scrum.sprint_backlog', string='Sprint Backlog', ondelete='cascade', readonly=True)
+    sprint_plan_id = fields.Many2one('scrum.sprint_plan', string='Sprint Plan', ondelete='cascade', readonly=True)
+    old_stage_id = fields.Many2one('scrum.sprint_stage', string='Previous Stage', ondelete='set null', readonly=True)
+    stage_id = fields.Many2one('scrum.sprint_stage', string='Stage', required=True, ondelete='restrict', readonly=True)
+    date = fields.Datetime(string='Date', required=True, default=fields.Datetime.now, readonly=True)
+    user_id = fields.Many2one('res.users', string='Changed By', default=lambda self: self.env.user, readonly=True)
+
+    def init(self):
+        tools.create_index(self._cr, 'scrum_sprint_task_stage_history_task_stage_date_idx',
+                           self._table, ['task_id', 'stage_id', 'date'])
+        tools.create_index(self._cr, 'scrum_sprint_task_stage_history_plan_date_idx',
+                           self._table, ['sprint_plan_id', 'date'])
+
+    def write(self, vals):
+        raise UserError(_('Stage history entries cannot be modified.'))
+
+    @api.model
+    def _get_done_dates(self, task_ids, done_stage_ids):
+        # {task id: date of its latest move into a done stage from a stage that was not}
+        if not task_ids or not done_stage_ids:
+            return {}
+        self.flush_model(['task_id', 'old_stage_id', 'stage_id', 'date'])
+        self.env.cr.execute("""
+            SELECT task_id, MAX(date)
+              FROM scrum_sprint_task_stage_history
+             WHERE task_id IN %(task_ids)s
+               AND stage_id IN %(done_stage_ids)s
+               AND (old_stage_id IS NULL OR old_stage_id NOT IN %(done_stage_ids)s)
+          GROUP BY task_id
+        """, {'task_ids': tuple(task_ids), 'done_stage_ids': tuple(done_stage_ids)})
+        return {task_id: done_date.date() for task_id, done_date in self.env.cr.fetchall()}
+
+    @api.model
+    def _record_transitions(self, tasks, old_stages=None):
+        old_stages = old_stages or {}
+        vals_list = [{
+            'task_id': task.id,
+            'sprint_backlog_id': task.sprint_backlog_id.id,
+            'sprint_plan_id': task.sprint_backlog_id.sprint_plan_id.id,
+            'old_stage_id': old_stages.get(task.id, False),
+            'stage_id': task.sprint_stage_id.id,
+        } for task in tasks if task.sprint_stage_id]
+        return self.sudo().create(vals_list)
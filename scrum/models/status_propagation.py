@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+from collections import defaultdict
+from odoo import models, api
+
+STORY_TO_BACKLOG_STATUS = {
+    'done': 'completed',
+    'in_progress': 'in_progress',
+}
+
+
+class ScrumStatusPropagation(models.AbstractModel):
+    _name = 'scrum.status_propagation'
+    _description = 'Scrum Status Propagation'
+
+    @api.model
+    def _propagate(self, model_name, ids):
+        # resolved right after the status write, so the rest of the transaction sees
+        # the cascaded statuses; every target status is applied as one batched write
+        if not ids or self.env.context.get('scrum_status_propagation'):
+            return
+        env = self.sudo().with_context(scrum_status_propagation=True).env
+        
+        stories = env['scrum.user_story'].browse(ids if model_name == 'scrum.user_story' else [])
+        backlogs = env['scrum.sprint_backlog'].browse(ids if model_name == 'scrum.sprint_backlog' else [])
+        
+        backlogs_by_status = defaultdict(lambda: env['scrum.sprint_backlog'])
+        for story in stories:
+            status = STORY_TO_BACKLOG_STATUS.get(story.status)
+            backlog = story.sprint_backlog_id
+            if not status or not backlog or backlog.status == status:
+                continue
+            # leave backlogs alone that their own constraint would refuse to complete
+            if status == 'completed' and backlog.completion_percentage < 100:
+                continue
+            backlogs_by_status[status] |= backlog
+        for status, status_backlogs in backlogs_by_status.items():
+            status_backlogs.write({'status': status})
+            backlogs |= status_backlogs
+        
+        plans_by_status = defaultdict(lambda: env['scrum.sprint_plan'])
+        for plan in backlogs.sprint_plan_id:
+            statuses = set(plan.sprint_backlog_ids.mapped('status'))
+            if statuses == {'completed'}:
+                if plan.status != 'completed':
+                    plans_by_status['completed'] |= plan
+            elif 'in_progress' in statuses and plan.status == 'planning':
+                plans_by_status['in_progress'] |= plan
+        for status, status_plans in plans_by_status.items():
+            status_plans.write({'status': status})
@@ -58,23 +58,11 @@ class ScrumUserStory(models.Model):
 
     project_id = fields.Many2one('project.project', string='Project', related='product_backlog_id.project_id', store=True, readonly=True)
     
-    @api.depends('sprint_task_ids', 'sprint_task_ids.sprint_stage_id')
+    @api.depends('sprint_task_ids', 'sprint_task_ids.sprint_stage_id', 'sprint_task_ids.sprint_stage_id.is_done')
     def _compute_task_progress(self):
+        counts = self.env['scrum.sprint_task']._get_completion_counts('user_story_id', self)
         for record in self:
-            tasks = record.sprint_task_ids
-            total_tasks = len(tasks)
-            if total_tasks == 0:
-                record.total_tasks = 0
-                record.completed_tasks = 0
-                record.task_completion_percentage = 0.0
-                continue
-            
-            done_stage = self.env['scrum.sprint_stage'].search([('name', '=ilike', 'Done')], limit=1)
-            if done_stage:
-                completed_tasks = sum(1 for task in tasks if task.sprint_stage_id.id == done_stage.id)
-            else:
-                completed_tasks = 0
-            
+            total_tasks, completed_tasks = counts.get(record.id, (0, 0))
             record.total_tasks = total_tasks
             record.completed_tasks = completed_tasks
             record.task_completion_percentage = (completed_tasks / total_tasks * 100) if total_tasks > 0 else 0.0
@@ -104,22 +92,8 @@ class ScrumUserStory(models.Model):
     def write(self, vals):
         result = super().write(vals)
         if 'status' in vals:
-            for record in self:
-                if record.sprint_backlog_id and vals['status'] != record.status:
-                    record._update_sprint_backlog_status()
+            self.env['scrum.status_propagation']._propagate(self._name, self.filtered('sprint_backlog_id').ids)
         return result
-    
-    def _update_sprint_backlog_status(self):
-        self.ensure_one()
-        if not self.sprint_backlog_id:
-            return
-        
-        sprint_backlog = self.sprint_backlog_id
-        
-        if self.status == 'done':
-            sprint_backlog.status = 'completed'
-        elif self.status == 'in_progress':
-            sprint_backlog.status = 'in_progress'
 
     def action_parse_to_tasks(self):
         self.ensure_one()
@@ -286,11 +260,39 @@ class ScrumUserStory(models.Model):
             },
         }
     
-    @api.depends('sprint_task_ids')
+    def action_batch_analyze_quality(self):
+        return self.env['scrum.ai_analysis']._queue_batch_analyses(self, 'quality')
+    
+    def action_batch_analyze_requirements(self):
+        return self.env['scrum.ai_analysis']._queue_batch_analyses(self, 'requirement')
+    
     def _compute_ai_analysis_count(self):
+        rollup = {}
+        if self.ids:
+            self.env['scrum.ai_analysis'].flush_model(['user_story_id', 'status', 'score', 'grade', 'analyzed_date'])
+            self.env.cr.execute("""
+                SELECT user_story_id,
+                       COUNT(*),
+                       (ARRAY_AGG(score ORDER BY analyzed_date DESC NULLS LAST, id DESC) FILTER (WHERE status = 'completed'))[1],
+                       (ARRAY_AGG(grade ORDER BY analyzed_date DESC NULLS LAST, id DESC) FILTER (WHERE status = 'completed'))[1]
+                  FROM scrum_ai_analysis
+                 WHERE user_story_id IN %s
+              GROUP BY user_story_id
+            """, [tuple(self.ids)])
+            rollup = {story_id: (count, score, grade) for story_id, count, score, grade in self.env.cr.fetchall()}
+        
         for record in self:
-            record.ai_analysis_count = self.env['scrum.ai_analysis'].search_count([
-                ('user_story_id', '=', record.id)
-            ])
+            count, score, grade = rollup.get(record.id, (0, 0.0, False))
+            record.ai_analysis_count = count
+            record.latest_ai_score = score or 0.0
+            record.latest_ai_grade = grade or False
     
-    ai_analysis_count = fields.Integer(string='AI Analysis Count', compute='_compute_ai_analysis_count')
\ No newline at end of file
+    ai_analysis_count = fields.Integer(string='AI Analysis Count', compute='_compute_ai_analysis_count')
+    latest_ai_score = fields.Float(string='Latest AI Score', digits=(5, 2), compute='_compute_ai_analysis_count')
+    latest_ai_grade = fields.Selection([
+        ('A', _('Excellent (90-100)')),
+        ('B', _('Good (80-89)')),
+        ('C', _('Average (70-79)')),
+        ('D', _('Poor (60-69)')),
+        ('E', _('Very Poor (0-59)')),
+    ], string='Latest AI Grade', compute='_compute_ai_analysis_count')
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+
+class ResponseCache:
+    """ Process-wide TTL + LRU cache for parsed AI responses. Concurrent
+    lookups of a key that is being computed wait for the in-flight call
+    instead of issuing their own. """
+
+    def __init__(self, max_entries=512, ttl=86400):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.coalesced = 0
+
+    def configure(self, max_entries, ttl):
+        with self._lock:
+            self.max_entries = max_entries
+            self.ttl = ttl
+            self._evict()
+
+    def _evict(self):
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get_or_compute(self, key, compute, fresh=False, cacheable=None):
+        """ Return ``(value, cached)``; ``fresh`` skips the stored entry but
+        still refreshes it, ``cacheable`` can veto storing a value. """
+        with self._lock:
+            entry = None if fresh else self._entries.get(key)
+            if entry and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1], True
+            if entry:
+                del self._entries[key]
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+        
+        if not owner:
+            return future.result(), True
+        
+        try:
+            value = compute()
+        except Exception as e:
+            with self._lock:
+                self._inflight.pop(key, None)
+            future.set_exception(e)
+            raise
+        
+        with self._lock:
+            self._inflight.pop(key, None)
+            if cacheable is None or cacheable(value):
+                self._entries[key] = (time.monotonic() + self.ttl, value)
+                self._entries.move_to_end(key)
+                self._evict()
+        future.set_result(value)
+        return value, False
+
+    def get(self, key, count_miss=True):
+        """ Return the stored value or None, without computing anything. Use
+        ``count_miss=False`` when the caller computes the value afterwards
+        through ``put`` or ``get_or_compute``, which count the miss. """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry:
+                del self._entries[key]
+            if count_miss:
+                self.misses += 1
+            return None
+
+    def put(self, key, value):
+        # storing a value computed by the caller after a lookup that missed
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'hit_rate': (self.hits + self.coalesced) / lookups if lookups else 0.0,
+            }
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+import json
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .ai_resilience import call_with_retries
+
+_logger = logging.getLogger(__name__)
+
+_endpoint_semaphores = {}
+_endpoint_semaphores_lock = threading.Lock()
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def _endpoint_key(endpoint):
+    return urlsplit(endpoint).netloc or endpoint
+
+
+def _get_endpoint_semaphore(endpoint, limit):
+    # process-wide so that concurrent cron workers in the same process share the
+    # limit; keyed by the limit too, so a changed setting applies without a restart
+    key = (_endpoint_key(endpoint), limit)
+    with _endpoint_semaphores_lock:
+        semaphore = _endpoint_semaphores.get(key)
+        if semaphore is None:
+            semaphore = _endpoint_semaphores[key] = threading.BoundedSemaphore(limit)
+        return semaphore
+
+
+def _get_session(endpoint, pool_size):
+    # keyed by pid as well: a prefork child must never reuse the sockets it
+    # inherited from its parent, so it lazily opens its own pool
+    key = (os.getpid(), _endpoint_key(endpoint))
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True)
+            session = requests.Session()
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _sessions[key] = session
+        return session
+
+
+def get_connection_stats():
+    """ Return the keep-alive statistics of the sessions opened by this
+    process: one entry per endpoint host with the number of requests sent
+    and of connections actually opened to serve them. """
+    pid = os.getpid()
+    with _sessions_lock:
+        sessions = [(host, session) for (session_pid, host), session in _sessions.items() if session_pid == pid]
+    
+    stats = []
+    for host, session in sessions:
+        num_requests = num_connections = 0
+        adapters = {id(adapter): adapter for adapter in session.adapters.values()}
+        for adapter in adapters.values():
+            pools = adapter.poolmanager.pools
+            for pool_key in pools.keys():
+                pool = pools[pool_key]
+                num_requests += pool.num_requests
+                num_connections += pool.num_connections
+        stats.append({
+            'endpoint': host,
+            'pid': pid,
+            'requests': num_requests,
+            'connections': num_connections,
+            'reuse_ratio': 1 - num_connections / num_requests if num_requests else 0.0,
+        })
+    return stats
+
+
+def post_chat_completion(request):
+    # ``request`` is the plain dict built by scrum.ai_analysis._prepare_ai_request;
+    # no ORM access happens here so it can run outside of any transaction
+    send = stream_chat_completion if request.get('stream') else _send_chat_completion
+    return call_with_retries(_endpoint_key(request['endpoint']), lambda: send(request), request.get('retry', {}))
+
+
+def _send_chat_completion(request):
+    session = _get_session(request['endpoint'], request.get('pool_size', 10))
+    response = session.post(request['endpoint'], headers=request['headers'], json=request['payload'], timeout=request['timeout'])
+    response.raise_for_status()
+    
+    result = response.json()
+    return result['choices'][0]['message']['content']
+
+
+def extract_partial_json_string(text, key):
+    """ Return the value received so far of the string field ``key`` in the
+    incomplete JSON document ``text``, or None when it has not started. """
+    match = re.search(r'"%s"\s*:\s*"' % re.escape(key), text)
+    if not match:
+        return None
+    chars = []
+    escaped = False
+    for char in text[match.end():]:
+        if escaped:
+            escaped = False
+        elif char == '\\':
+            escaped = True
+        elif char == '"':
+            break
+        chars.append(char)
+    # drop an escape sequence cut off by the end of the received text
+    if escaped:
+        chars.pop()
+    raw = re.sub(r'(?<!\\)\\u[0-9a-fA-F]{0,3}$', '', ''.join(chars))
+    try:
+        return json.loads(f'"{raw}"')
+    except ValueError:
+        return raw
+
+
+def stream_chat_completion(request):
+    """ Read a server-sent events completion, handing the text received so
+    far to ``request['on_partial']`` at most every ``partial_interval``
+    seconds (the first chunk is always handed over). Returns the full text. """
+    session = _get_session(request['endpoint'], request.get('pool_size', 10))
+    payload = dict(request['payload'], stream=True)
+    on_partial = request.get('on_partial')
+    interval = request.get('partial_interval', 2.0)
+    
+    chunks = []
+    last_partial = None
+    with session.post(request['endpoint'], headers=request['headers'], json=payload, timeout=request['timeout'], stream=True) as response:
+        response.raise_for_status()
+        # event streams are UTF-8 by definition; requests would guess ISO-8859-1
+        # when the server sends no charset
+        for raw_line in response.iter_lines():
+            line = raw_line.decode('utf-8')
+            if not line or not line.startswith('data:'):
+                continue
+            data = line[len('data:'):].strip()
+            if data == '[DONE]':
+                break
+            choices = json.loads(data).get('choices') or [{}]
+            content = (choices[0].get('delta') or {}).get('content')
+            if not content:
+                continue
+            chunks.append(content)
+            
+            now = time.monotonic()
+            if on_partial and (last_partial is None or now - last_partial >= interval):
+                last_partial = now
+                try:
+                    on_partial(''.join(chunks))
+                except Exception as e:
+                    # partial feedback is best effort, the final result is written anyway
+                    _logger.warning('Could not store partial AI response: %s', e)
+    return ''.join(chunks)
+
+
+def post_chat_completions(requests_list, max_workers=8, endpoint_limit=4, parse=None, cache=None, cacheable=None):
+    """ Run several chat completions concurrently, at most ``endpoint_limit``
+    at a time against the same host. Returns ``(result, error, cached)``
+    triples in the order of ``requests_list``; ``result`` is the content
+    passed through the request's own ``parse`` or else ``parse`` when given.
+    Requests carrying a ``cache_key`` are served from / stored in ``cache``. """
+    def call(request):
+        with _get_endpoint_semaphore(request['endpoint'], endpoint_limit):
+            content = post_chat_completion(request)
+        parse_content = request.get('parse') or parse
+        return parse_content(content) if parse_content else content
+    
+    def run(request):
+        try:
+            if cache is not None and request.get('cache_key'):
+                result, cached = cache.get_or_compute(
+                    request['cache_key'], lambda: call(request),
+                    fresh=request.get('fresh', False), cacheable=cacheable,
+                )
+                return result, None, cached
+            return call(request), None, False
+        except Exception as e:
+            return None, e, False
+    
+    if not requests_list:
+        return []
+    if len(requests_list) == 1:
+        return [run(requests_list[0])]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(requests_list)), thread_name_prefix='scrum_ai') as executor:
+        return list(executor.map(run, requests_list))
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+import logging
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import requests
+
+_logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class RetryLaterError(Exception):
+    """ The endpoint cannot take the call now; it should be made again in
+    ``retry_in`` seconds rather than counted as a failure. """
+
+    def __init__(self, endpoint, retry_in):
+        super().__init__(f'AI endpoint {endpoint} is unavailable, retrying in {retry_in:.0f}s')
+        self.endpoint = endpoint
+        self.retry_in = retry_in
+
+
+class CircuitOpenError(RetryLaterError):
+    """ Raised without calling the endpoint while its circuit is open. """
+
+
+class CircuitBreaker:
+    """ Opens after ``failure_threshold`` consecutive failures and fails fast
+    for ``reset_timeout`` seconds; then lets a single trial call through and
+    closes again if it succeeds. """
+
+    def __init__(self, endpoint, failure_threshold=5, reset_timeout=60):
+        self.endpoint = endpoint
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self._opened_at is None:
+                return
+            retry_in = self._opened_at + self.reset_timeout - time.monotonic()
+            if retry_in > 0 or self._trial_running:
+                raise CircuitOpenError(self.endpoint, max(retry_in, 0))
+            self._trial_running = True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_running or self._failures >= self.failure_threshold:
+                if self._opened_at is None or self._trial_running:
+                    _logger.warning('Opening circuit for AI endpoint %s after %s failures', self.endpoint, self._failures)
+                self._opened_at = time.monotonic()
+                self._trial_running = False
+
+
+class RetryBudget:
+    """ Every first attempt earns ``ratio`` retry tokens, every retry spends
+    one, so retries stay a bounded share of the traffic during an incident. """
+
+    def __init__(self, ratio=0.2, max_tokens=10):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self._tokens = max_tokens
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def withdraw(self):
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+_breakers = {}
+_budgets = {}
+_registry_lock = threading.Lock()
+
+
+def get_circuit_breaker(endpoint, settings):
+    with _registry_lock:
+        breaker = _breakers.get(endpoint)
+        if breaker is None:
+            breaker = _breakers[endpoint] = CircuitBreaker(endpoint)
+        breaker.failure_threshold = settings.get('circuit_failure_threshold', 5)
+        breaker.reset_timeout = settings.get('circuit_reset_timeout', 60)
+        return breaker
+
+
+def get_retry_budget(endpoint, settings):
+    with _registry_lock:
+        budget = _budgets.get(endpoint)
+        if budget is None:
+            budget = _budgets[endpoint] = RetryBudget()
+        budget.ratio = settings.get('retry_budget_ratio', 0.2)
+        return budget
+
+
+def is_retryable(error):
+    if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+        return True
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        return error.response.status_code in RETRYABLE_STATUS_CODES
+    return False
+
+
+def get_retry_after(error):
+    # Retry-After is either a number of seconds or an HTTP date
+    response = getattr(error, 'response', None)
+    value = response.headers.get('Retry-After') if response is not None else None
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def get_backoff_delay(attempt, error, base=1.0, cap=30.0):
+    retry_after = get_retry_after(error)
+    if retry_after is not None:
+        return retry_after
+    # full jitter keeps workers that failed together from retrying together
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def call_with_retries(endpoint, func, settings):
+    """ Call ``func`` through the circuit breaker of ``endpoint``, retrying
+    transient failures with jittered exponential backoff while the retry
+    budget allows it. """
+    breaker = get_circuit_breaker(endpoint, settings)
+    budget = get_retry_budget(endpoint, settings)
+    max_retries = settings.get('max_retries', 3)
+    backoff_max = settings.get('backoff_max', 30.0)
+    
+    budget.deposit()
+    attempt = 0
+    while True:
+        breaker.before_call()
+        try:
+            result = func()
+        except Exception as e:
+            if not is_retryable(e):
+                # the provider answered, only the request itself was refused
+                breaker.record_success()
+                raise
+            breaker.record_failure()
+            retry_after = get_retry_after(e)
+            delay = get_backoff_delay(attempt, e, settings.get('backoff_base', 1.0), backoff_max)
+            if attempt >= max_retries or delay > backoff_max or not budget.withdraw():
+                if retry_after is not None:
+                    # the provider said when to come back: a later run should, not this one
+                    raise RetryLaterError(endpoint, retry_after) from e
+                raise
+            _logger.info('Retrying AI endpoint %s in %.1fs after: %s', endpoint, delay, e)
+            time.sleep(delay)
+            attempt += 1
+        else:
+            breaker.record_success()
+            return result
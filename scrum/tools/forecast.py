@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+import logging
+import math
+from datetime import timedelta
+
+_logger = logging.getLogger(__name__)
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+    _logger.debug('numpy is not installed, Monte Carlo forecasting is disabled')
+
+
+def simulate_completion_days(throughput_samples, remaining, runs=10000, horizon=365, block=30, seed=None):
+    # Bootstrap daily throughput until ``remaining`` work is burnt; returns the
+    # number of days each run needed, or None when no run can ever finish.
+    if np is None:
+        raise ImportError('numpy is required for Monte Carlo forecasting')
+    
+    samples = np.clip(np.asarray(throughput_samples, dtype=float), 0, None)
+    if remaining <= 0:
+        return np.zeros(runs)
+    if not samples.size or not samples.any():
+        return None
+    
+    rng = np.random.default_rng(seed)
+    days = np.full(runs, np.nan)
+    done = np.zeros(runs)
+    active = np.arange(runs)
+    
+    for start in range(0, horizon, block):
+        width = min(block, horizon - start)
+        cumulative = done[active, None] + np.cumsum(rng.choice(samples, size=(active.size, width)), axis=1)
+        reached = cumulative >= remaining
+        finished = reached.any(axis=1)
+        days[active[finished]] = start + reached[finished].argmax(axis=1) + 1
+        done[active] = cumulative[:, -1]
+        active = active[~finished]
+        if not active.size:
+            break
+    
+    # runs still open at the horizon land past it, so percentiles reaching
+    # them are recognisable as "beyond the horizon"
+    days[np.isnan(days)] = horizon + 1
+    return days
+
+
+def completion_percentiles(throughput_samples, remaining, percentiles=(50, 85, 95), horizon=365, **kwargs):
+    # {percentile: days}, with None for percentiles the simulation could not reach
+    days = simulate_completion_days(throughput_samples, remaining, horizon=horizon, **kwargs)
+    if days is None:
+        return None
+    return {
+        p: int(math.ceil(value)) if value <= horizon else None
+        for p, value in zip(percentiles, np.percentile(days, percentiles))
+    }
+
+
+def percentile_date(start, result, percentile):
+    if not result or result.get(percentile) is None:
+        return False
+    return start + timedelta(days=result[percentile])
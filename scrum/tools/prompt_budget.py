@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+import functools
+import logging
+import math
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+_logger = logging.getLogger(__name__)
+
+# prompt tokens allowed per model family, i.e. the context window minus room
+# for the completion; the most specific prefix must come first
+MODEL_PROMPT_BUDGETS = [
+    ('gpt-4o', 100000),
+    ('gpt-4.1', 100000),
+    ('gpt-4-turbo', 100000),
+    ('gpt-4-32k', 28000),
+    ('gpt-4', 6000),
+    ('gpt-3.5-turbo', 12000),
+]
+DEFAULT_PROMPT_BUDGET = 6000
+
+# rough ratio used when no tokenizer is available
+CHARS_PER_TOKEN = 4
+TRUNCATION_MARK = ' [...]'
+
+
+def get_prompt_budget(model):
+    for prefix, budget in MODEL_PROMPT_BUDGETS:
+        if (model or '').startswith(prefix):
+            return budget
+    return DEFAULT_PROMPT_BUDGET
+
+
+@functools.lru_cache(maxsize=16)
+def _get_encoding(model):
+    if tiktoken is None:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding('cl100k_base')
+    except Exception as e:
+        # the encoding files may not be downloadable from this server
+        _logger.warning('Falling back to estimated token counts: %s', e)
+        return None
+
+
+def count_tokens(text, model):
+    if not text:
+        return 0
+    encoding = _get_encoding(model)
+    if encoding is None:
+        return math.ceil(len(text) / CHARS_PER_TOKEN)
+    return len(encoding.encode(text))
+
+
+def truncate_text(text, max_tokens, model):
+    """ Keep the head of ``text`` within ``max_tokens``, marking the cut. The
+    result only depends on the input so prompts stay cacheable. """
+    if not text:
+        return text
+    text = str(text).strip()
+    if count_tokens(text, model) <= max_tokens:
+        return text
+    if max_tokens <= 0:
+        return TRUNCATION_MARK.strip()
+    encoding = _get_encoding(model)
+    if encoding is None:
+        head = text[:max_tokens * CHARS_PER_TOKEN]
+    else:
+        head = encoding.decode(encoding.encode(text)[:max_tokens])
+    return head.rstrip() + TRUNCATION_MARK
+
+
+def take_within_budget(lines, max_tokens, model):
+    """ Keep the leading ``lines`` (already ranked) that fit in ``max_tokens``;
+    returns the kept lines and the number of lines left out. """
+    kept = []
+    used = 0
+    for line in lines:
+        tokens = count_tokens(line, model) + 1
+        if used + tokens > max_tokens:
+            break
+        kept.append(line)
+        used += tokens
+    return kept, len(lines) - len(kept)